@@ -0,0 +1,123 @@
+"""
+Avatar transcoding and generated initials avatars.
+
+Uploaded images are decoded, cropped to a square and re-encoded as WEBP in a
+few fixed sizes. Pillow work is CPU-bound, so it runs in a process pool and
+never blocks the event loop.
+
+Users without an uploaded avatar get a small SVG with their initials on a
+colour derived from their name.
+"""
+import asyncio
+import hashlib
+import html
+import io
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from avatar_store import InvalidAvatar
+
+# Thumbnail edge lengths addressable with GET /api/avatar/{hash}?size=
+AVATAR_SIZES = (64, 128, 256)
+
+# Edge length of the default (no size) variant
+FULL_SIZE = 512
+
+# Decoded images larger than this are rejected before any resizing
+MAX_SOURCE_PIXELS = 40_000_000
+
+WEBP_QUALITY = 80
+
+# Longest name accepted by GET /api/avatar/initials
+MAX_INITIALS_NAME_LENGTH = 100
+
+_INITIALS_COLOURS = (
+    "#E53E3E", "#DD6B20", "#D69E2E", "#38A169", "#319795", "#3182CE",
+    "#5A67D8", "#805AD5", "#D53F8C", "#2F855A", "#C05621", "#2B6CB0",
+)
+
+
+def _encode_webp(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def transcode_avatar(data: bytes) -> Dict[str, bytes]:
+    """
+    Decode an image and return its WEBP variants: "full" plus one per AVATAR_SIZES entry.
+    Runs in a worker process.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        if width * height > MAX_SOURCE_PIXELS:
+            raise InvalidAvatar("Avatar dimensions are too large")
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidAvatar(f"Avatar is not a readable image: {e}")
+
+    # Avatars are always displayed as squares, crop once around the centre
+    edge = min(image.size)
+    square = ImageOps.fit(image, (edge, edge), method=Image.Resampling.LANCZOS)
+
+    variants = {}
+    for size in AVATAR_SIZES:
+        variants[str(size)] = _encode_webp(square.resize((size, size), Image.Resampling.LANCZOS))
+    if edge > FULL_SIZE:
+        square = square.resize((FULL_SIZE, FULL_SIZE), Image.Resampling.LANCZOS)
+    variants["full"] = _encode_webp(square)
+    return variants
+
+
+class AvatarProcessor:
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def transcode(self, data: bytes) -> Dict[str, bytes]:
+        if self._executor is None:
+            # Spawned workers do not inherit the parent's event loop or client threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, transcode_avatar, data)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool on the next upload
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def normalize_initials_name(name: str) -> str:
+    return " ".join(name.split())
+
+
+@lru_cache(maxsize=4096)
+def render_initials_svg(name: str) -> bytes:
+    """
+    SVG avatar with the first and last initials; the same name always gives the same image
+    """
+    words = name.split()
+    initials = "".join(word[0] for word in words[:1] + words[1:][-1:]).upper() or "?"
+    colour = _INITIALS_COLOURS[int(hashlib.sha1(name.encode()).hexdigest(), 16) % len(_INITIALS_COLOURS)]
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="128" height="128" viewBox="0 0 128 128">'
+        f'<rect width="128" height="128" fill="{colour}"/>'
+        '<text x="64" y="64" dy=".35em" text-anchor="middle" fill="#FFFFFF" '
+        'font-family="Helvetica, Arial, sans-serif" font-size="52" font-weight="600">'
+        f'{html.escape(initials)}</text></svg>'
+    ).encode()
@@ -0,0 +1,225 @@
+"""
+Content-addressed storage for profile avatars.
+
+Avatars are stored once, keyed by the SHA-256 of the uploaded bytes; profiles
+only keep that hash (avatar_hash) and clients fetch the image from
+GET /api/avatar/{hash}[?size=N], which can be cached forever. Each upload is
+stored as its transcoded variants: the full image under the hash itself and
+every thumbnail under variant_key(hash, size).
+
+    gridfs      - the "avatars" GridFS bucket (default)
+    filesystem  - files under AVATAR_STORE_PATH, sharded by hash prefix
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+AVATAR_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+_DATA_URL_PATTERN = re.compile(r'^data:(?P<content_type>[\w/+.-]+)?(;[\w=-]+)*;base64,', re.IGNORECASE)
+
+
+class InvalidAvatar(ValueError):
+    pass
+
+
+class AvatarTooLarge(InvalidAvatar):
+    pass
+
+
+def decode_avatar(value: str, max_bytes: Optional[int] = None) -> Tuple[bytes, str]:
+    """
+    Decode a base64 avatar, either a data URL or bare base64, into (bytes, content type)
+    """
+    content_type = "application/octet-stream"
+    match = _DATA_URL_PATTERN.match(value)
+    if match:
+        content_type = match.group("content_type") or content_type
+        value = value[match.end():]
+
+    # Check the encoded length first so oversized uploads are never decoded
+    if max_bytes is not None and len(value) * 3 // 4 > max_bytes + 2:
+        raise AvatarTooLarge(f"Avatar is larger than {max_bytes} bytes")
+
+    try:
+        data = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidAvatar("Avatar is not valid base64")
+    if not data:
+        raise InvalidAvatar("Avatar is empty")
+
+    if content_type == "application/octet-stream":
+        content_type = sniff_content_type(data)
+    return data, content_type
+
+
+def sniff_content_type(data: bytes) -> str:
+    if data.startswith(b'\x89PNG'):
+        return "image/png"
+    if data.startswith(b'\xff\xd8'):
+        return "image/jpeg"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "image/webp"
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def variant_key(avatar_hash: str, size: Optional[int] = None) -> str:
+    return f"{avatar_hash}_{size}" if size else avatar_hash
+
+
+class AvatarStore:
+    async def put(self, data: bytes, content_type: str, key: Optional[str] = None) -> str:
+        """
+        Store avatar bytes (idempotent) under `key`, by default their content hash, and return the key
+        """
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def get(self, avatar_hash: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Return (bytes, content type) or None if unknown
+        """
+        raise NotImplementedError
+
+
+class GridFSAvatarStore(AvatarStore):
+    def __init__(self, db, bucket_name: str = "avatars"):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+
+    async def put(self, data: bytes, content_type: str, key: Optional[str] = None) -> str:
+        key = key or content_hash(data)
+        if await self.exists(key):
+            return key
+
+        try:
+            await self.bucket.upload_from_stream_with_id(
+                key,
+                key,
+                data,
+                metadata={"content_type": content_type}
+            )
+        except DuplicateKeyError:
+            # Same image uploaded concurrently, the other upload won
+            pass
+        return key
+
+    async def exists(self, key: str) -> bool:
+        return await self.files.find_one({"_id": key}, {"_id": 1}) is not None
+
+    async def get(self, avatar_hash: str) -> Optional[Tuple[bytes, str]]:
+        try:
+            grid_out = await self.bucket.open_download_stream(avatar_hash)
+        except NoFile:
+            return None
+        data = await grid_out.read()
+        metadata = grid_out.metadata or {}
+        return data, metadata.get("content_type") or sniff_content_type(data)
+
+
+class FileSystemAvatarStore(AvatarStore):
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, avatar_hash: str) -> Path:
+        return self.root / avatar_hash[:2] / avatar_hash
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so readers never see a partial file
+            tmp_path = path.with_name(f"{key}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    # File I/O runs in a thread so a slow disk does not block the event loop
+    async def put(self, data: bytes, content_type: str, key: Optional[str] = None) -> str:
+        key = key or content_hash(data)
+        await asyncio.to_thread(self._write, key, data)
+        return key
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._path(key).exists)
+
+    async def get(self, avatar_hash: str) -> Optional[Tuple[bytes, str]]:
+        data = await asyncio.to_thread(self._read, avatar_hash)
+        if data is None:
+            return None
+        return data, sniff_content_type(data)
+
+
+def create_avatar_store(backend: str, db=None, path: Optional[str] = None) -> AvatarStore:
+    if backend == "gridfs":
+        return GridFSAvatarStore(db)
+    if backend == "filesystem":
+        return FileSystemAvatarStore(path)
+    raise ValueError(f"Unknown avatar store backend: {backend}")
+
+
+Transcoder = Callable[[bytes], Awaitable[Dict[str, bytes]]]
+
+
+async def save_avatar(store: AvatarStore, data: bytes, transcode: Transcoder) -> str:
+    """
+    Transcode an uploaded image into its variants, store them and return the avatar hash.
+    Images already in the store are not transcoded again.
+    """
+    avatar_hash = content_hash(data)
+    if await store.exists(avatar_hash):
+        return avatar_hash
+
+    variants = await transcode(data)
+    for name, variant in variants.items():
+        if name != "full":
+            await store.put(variant, "image/webp", variant_key(avatar_hash, name))
+    # Written last: once the full image exists, every thumbnail does too
+    await store.put(variants["full"], "image/webp", avatar_hash)
+    return avatar_hash
+
+
+async def migrate_inline_avatars(db, store: AvatarStore, transcode: Transcoder, batch_size: int = 100) -> int:
+    """
+    Move avatar_base64 still embedded in user_profiles into the store
+    """
+    migrated = 0
+    cursor = db.user_profiles.find(
+        {"avatar_base64": {"$nin": [None, ""]}},
+        {"_id": 0, "id": 1, "avatar_base64": 1}
+    ).batch_size(batch_size)
+    async for profile in cursor:
+        update = {"$unset": {"avatar_base64": ""}}
+        try:
+            data, _ = decode_avatar(profile["avatar_base64"])
+            update["$set"] = {"avatar_hash": await save_avatar(store, data, transcode)}
+        except InvalidAvatar:
+            logger.warning(f"Dropping undecodable avatar of profile {profile['id']}")
+        await db.user_profiles.update_one({"id": profile["id"]}, update)
+        migrated += 1
+    return migrated
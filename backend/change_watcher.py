@@ -0,0 +1,185 @@
+"""
+Cross-worker cache invalidation through MongoDB change streams.
+
+Every worker keeps in-process caches (sessions, profiles). A single
+database-level change stream filtered to the watched collections tells each
+worker about writes made by the others, and the watcher hands every change
+to the callbacks subscribed for its collection.
+
+The last processed resume token is checkpointed in change_stream_state, so
+a restarted or reconnected watcher continues where it stopped instead of
+replaying the oplog or skipping writes. When no token can be resumed from,
+subscribers are reset (their caches cleared) since changes may have been
+missed.
+
+Change streams need a replica set; on a standalone mongod the watcher logs a
+warning and stays disabled, and caches fall back to their TTLs. A local
+single-node replica set (mongod --replSet rs0, then rs.initiate()) is enough
+for development.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+ChangeCallback = Callable[[Dict], None]
+
+# $changeStream is only supported on replica sets
+_NOT_A_REPLICA_SET = 40573
+# The resume token fell out of the oplog, or cannot be resumed from
+_UNRESUMABLE = (260, 280, 286)
+
+
+class ChangeWatcher:
+    def __init__(self, db, name: str = "cache-invalidation", checkpoint_interval: float = 5.0,
+                 max_retry_delay: float = 60.0):
+        self.db = db
+        self.name = name
+        self.checkpoint_interval = checkpoint_interval
+        self.max_retry_delay = max_retry_delay
+        self.state = db.change_stream_state
+        self._subscribers: Dict[str, List[ChangeCallback]] = {}
+        # collection -> operation types to receive, None for all
+        self._operations: Dict[str, Optional[set]] = {}
+        self._reset_callbacks: List[Callable[[], None]] = []
+        self._fields = {"id"}
+        self._resume_token = None
+        self._last_checkpoint = 0.0
+        self.active = False
+        self.disabled_reason: Optional[str] = None
+        self.events = 0
+        self.resets = 0
+        self.last_event_at: Optional[str] = None
+
+    def subscribe(self, collection: str, callback: ChangeCallback, fields: Iterable[str] = (),
+                  operations: Optional[Iterable[str]] = None) -> None:
+        """
+        Call `callback(change)` for writes to `collection` (only `operations`, e.g. ["delete"],
+        if given). `fields` are the document fields the callback reads from change["fullDocument"].
+        """
+        self._subscribers.setdefault(collection, []).append(callback)
+        self._fields.update(fields)
+        if operations is None or self._operations.get(collection, set()) is None:
+            self._operations[collection] = None
+        else:
+            self._operations[collection] = self._operations.get(collection, set()) | set(operations)
+
+    def on_reset(self, callback: Callable[[], None]) -> None:
+        """
+        Call `callback()` whenever changes may have been missed
+        """
+        self._reset_callbacks.append(callback)
+
+    def _pipeline(self) -> List[Dict]:
+        projection = {
+            "operationType": 1,
+            "ns": 1,
+            "documentKey": 1,
+            **{f"fullDocument.{field}": 1 for field in self._fields}
+        }
+        filters = []
+        for collection, operations in self._operations.items():
+            if operations is None:
+                filters.append({"ns.coll": collection})
+            else:
+                filters.append({"ns.coll": collection, "operationType": {"$in": sorted(operations)}})
+        return [
+            {"$match": {"$or": filters}},
+            {"$project": projection}
+        ]
+
+    def _dispatch(self, change: Dict) -> None:
+        for callback in self._subscribers.get(change["ns"]["coll"], []):
+            try:
+                callback(change)
+            except Exception as e:
+                logger.error(f"Error handling {change['ns']['coll']} change: {str(e)}")
+        self.events += 1
+        self.last_event_at = datetime.utcnow().isoformat()
+
+    def _reset(self) -> None:
+        self.resets += 1
+        for callback in self._reset_callbacks:
+            callback()
+
+    async def _checkpoint(self, force: bool = False) -> None:
+        if self._resume_token is None:
+            return
+        if not force and time.monotonic() - self._last_checkpoint < self.checkpoint_interval:
+            return
+        await self.state.update_one(
+            {"_id": self.name},
+            {"$set": {"resume_token": self._resume_token, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        self._last_checkpoint = time.monotonic()
+
+    async def run(self) -> None:
+        if not self._subscribers:
+            return
+
+        state = await self.state.find_one({"_id": self.name})
+        self._resume_token = state["resume_token"] if state else None
+        retry_delay = 1.0
+
+        try:
+            while True:
+                try:
+                    async with self.db.watch(
+                        self._pipeline(),
+                        full_document="updateLookup",
+                        resume_after=self._resume_token
+                    ) as stream:
+                        if self._resume_token is None:
+                            # Starting from "now": anything before is unknown
+                            self._reset()
+                        self.active = True
+                        retry_delay = 1.0
+                        logger.info(f"Change stream {self.name} watching {sorted(self._subscribers)}")
+
+                        async for change in stream:
+                            self._dispatch(change)
+                            self._resume_token = stream.resume_token
+                            await self._checkpoint()
+                except OperationFailure as e:
+                    self.active = False
+                    if e.code == _NOT_A_REPLICA_SET:
+                        self.disabled_reason = "not a replica set"
+                        logger.warning(
+                            "Change streams need a replica set; cross-worker cache invalidation "
+                            "is disabled and caches rely on their TTL"
+                        )
+                        return
+                    if e.code in _UNRESUMABLE:
+                        logger.warning(f"Change stream {self.name} cannot resume ({e.code}), starting fresh")
+                        self._resume_token = None
+                        continue
+                    logger.error(f"Change stream {self.name} failed: {str(e)}")
+                except Exception as e:
+                    self.active = False
+                    logger.error(f"Change stream {self.name} failed: {str(e)}")
+
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.max_retry_delay)
+        finally:
+            self.active = False
+            try:
+                await self._checkpoint(force=True)
+            except Exception as e:
+                logger.error(f"Error saving change stream checkpoint: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "active": self.active,
+            "disabled_reason": self.disabled_reason,
+            "collections": sorted(self._subscribers),
+            "events": self.events,
+            "resets": self.resets,
+            "last_event_at": self.last_event_at,
+        }
@@ -0,0 +1,37 @@
+"""
+Version counters for derived lists, used to build ETags.
+
+Each counter lives in the collection_versions collection under a key such
+as "contacts:<profile id>" or "channels:<stream user id>" and is bumped
+whenever something that list shows changes. Reading one counter is enough
+to answer a conditional GET without building the list.
+"""
+from typing import Iterable
+
+from pymongo import UpdateOne
+
+
+def contacts_key(profile_id: str) -> str:
+    return f"contacts:{profile_id}"
+
+
+def channels_key(user_id: str) -> str:
+    return f"channels:{user_id}"
+
+
+class CollectionVersions:
+    def __init__(self, db):
+        self.collection = db.collection_versions
+
+    async def get(self, key: str) -> int:
+        document = await self.collection.find_one({"_id": key}, {"version": 1})
+        return document["version"] if document else 0
+
+    async def bump(self, keys: Iterable[str]) -> None:
+        keys = set(keys)
+        if not keys:
+            return
+        await self.collection.bulk_write([
+            UpdateOne({"_id": key}, {"$inc": {"version": 1}}, upsert=True)
+            for key in keys
+        ], ordered=False)
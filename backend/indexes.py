@@ -0,0 +1,103 @@
+"""
+MongoDB index bootstrap.
+
+ensure_indexes() is run on startup. It is idempotent: indexes whose key
+pattern already exists are left alone, missing ones are created, and a
+report of what happened is returned for logging.
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, List
+
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+# Verified sessions stay valid for 24 hours after verification
+VERIFIED_SESSION_LIFETIME = timedelta(hours=24)
+
+# collection -> list of (name, keys, options)
+INDEX_SPECS = {
+    "user_sessions": [
+        ("id_unique", [("id", ASCENDING)], {"unique": True}),
+        ("phone_country_verified", [("phone", ASCENDING), ("country_code", ASCENDING), ("is_verified", ASCENDING)], {}),
+        # At most one pending (unverified) session per phone, so concurrent
+        # send-code upserts cannot create duplicates
+        ("pending_phone_unique", [("phone", ASCENDING), ("country_code", ASCENDING)], {
+            "unique": True,
+            "partialFilterExpression": {"is_verified": False}
+        }),
+        # Expired sessions are purged by the server's TTL monitor
+        ("expires_at_ttl", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "user_profiles": [
+        ("id_unique", [("id", ASCENDING)], {"unique": True}),
+        ("phone_country", [("phone", ASCENDING), ("country_code", ASCENDING)], {}),
+        # Contact discovery matches on the canonical number
+        ("phone_key", [("phone_key", ASCENDING)], {}),
+    ],
+    "user_contacts": [
+        ("user_contact", [("user_id", ASCENDING), ("contact_id", ASCENDING)], {}),
+        # Whose contact lists show a profile, for bump_contact_lists on profile writes
+        ("contact_user", [("contact_id", ASCENDING), ("user_id", ASCENDING)], {}),
+        # Keyset pagination of a user's contacts
+        ("user_added_at", [("user_id", ASCENDING), ("added_at", ASCENDING), ("id", ASCENDING)], {}),
+    ],
+    "chat_channels": [
+        # Also serves plain membership lookups
+        ("members_created_at", [("members", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], {}),
+    ],
+    "status_checks": [
+        ("timestamp_id", [("timestamp", ASCENDING), ("id", ASCENDING)], {}),
+    ],
+    "revoked_sessions": [
+        ("session_id_unique", [("session_id", ASCENDING)], {"unique": True}),
+        ("expires_at_ttl", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+}
+
+
+async def backfill_verified_session_expiry(db) -> int:
+    """
+    Align expires_at of verified sessions with their 24h lifetime.
+    Must run before the TTL index exists, otherwise sessions verified before
+    the upgrade would be purged 5 minutes after creation.
+    """
+    result = await db.user_sessions.update_many(
+        {"is_verified": True},
+        [{"$set": {"expires_at": {"$add": ["$created_at", int(VERIFIED_SESSION_LIFETIME.total_seconds() * 1000)]}}}]
+    )
+    return result.modified_count
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Create missing indexes and return {"created": [...], "existing": [...], "failed": [...]}
+    """
+    report = {"created": [], "existing": [], "failed": []}
+
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        existing_keys = {
+            tuple(tuple(key) for key in info["key"])
+            for info in (await collection.index_information()).values()
+        }
+
+        for name, keys, options in specs:
+            label = f"{collection_name}.{name}"
+            if tuple(keys) in existing_keys:
+                report["existing"].append(label)
+                continue
+
+            try:
+                if label == "user_sessions.expires_at_ttl":
+                    backfilled = await backfill_verified_session_expiry(db)
+                    logger.info(f"Backfilled expires_at on {backfilled} verified sessions")
+
+                await collection.create_index(keys, name=name, **options)
+                report["created"].append(label)
+            except Exception as e:
+                logger.error(f"Error creating index {label}: {str(e)}")
+                report["failed"].append(label)
+
+    return report
@@ -0,0 +1,78 @@
+"""
+Keyset pagination with opaque cursors.
+
+Lists are sorted on (sort field, id) and a page ends with a cursor holding
+the last document's sort value and id. The next page starts strictly after
+that key, so with an index on the query fields plus (sort field, id) every
+page costs the same whatever its position, unlike skip().
+
+Cursors are base64url-encoded JSON; clients must treat them as opaque.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_value: Any, document_id: str) -> str:
+    if isinstance(sort_value, datetime):
+        value = {"dt": sort_value.isoformat()}
+    else:
+        value = {"v": sort_value}
+    payload = json.dumps([value, document_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, document_id = json.loads(payload)
+        if not isinstance(document_id, str):
+            raise InvalidCursor("Cursor id must be a string")
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"]), document_id
+        return value["v"], document_id
+    except InvalidCursor:
+        raise
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+
+
+async def keyset_page(collection, query: Dict, sort_field: str, limit: int,
+                      cursor: Optional[str] = None,
+                      projection: Optional[Dict] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of documents matching `query`, ordered by (sort_field, id).
+    Returns the documents and the cursor of the next page, or None on the last page.
+    """
+    if cursor:
+        sort_value, document_id = decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {sort_field: {"$gt": sort_value}},
+            {sort_field: sort_value, "id": {"$gt": document_id}},
+        ]}]}
+    if projection is not None:
+        # The cursor is built from these two fields
+        projection = {**projection, sort_field: 1, "id": 1}
+
+    # One extra document tells whether another page follows
+    documents = await collection.find(query, projection).sort(
+        [(sort_field, ASCENDING), ("id", ASCENDING)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last[sort_field], last["id"])
+    return documents, next_cursor
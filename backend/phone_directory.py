@@ -0,0 +1,66 @@
+"""
+In-memory phone directory: (country_code, phone) -> contact card.
+
+User search and add-contact look a number up here instead of querying
+user_profiles. The directory holds the card fields of every profile (see
+PROFILE_VIEWS["card"]); it is built by ProfileIndexLoader and kept current
+with put() and update() after local writes and, for other workers' writes,
+from the change stream.
+
+A miss is only final while the directory is live, i.e. while the change
+stream delivers other workers' writes. Otherwise callers fall back to the
+database on a miss, and the loader rebuilds the directory periodically so
+updated cards do not stay stale for long.
+"""
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from profile_index import ProfileIndex
+
+Cards = Dict[Tuple[str, str], Dict[str, Any]]
+
+
+class PhoneDirectory(ProfileIndex):
+    def __init__(self, fields: Iterable[str], is_live: Callable[[], bool] = lambda: False):
+        self.fields = tuple(fields)
+        self.is_live = is_live
+        self.hits = 0
+        self.misses = 0
+        super().__init__()
+
+    def _empty(self) -> Cards:
+        return {}
+
+    def _insert(self, state: Cards, profile: Dict[str, Any]) -> None:
+        state[(profile["country_code"], profile["phone"])] = {field: profile.get(field) for field in self.fields}
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether a miss means the number is not registered
+        """
+        return self.ready and self.is_live()
+
+    def get(self, phone: str, country_code: str) -> Optional[Dict[str, Any]]:
+        card = self._state.get((country_code, phone))
+        if card is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return card
+
+    def update(self, phone: str, country_code: str, changes: Dict[str, Any]) -> None:
+        """
+        Apply profile changes to a number's card, if it is in the directory
+        """
+        card = self._state.get((country_code, phone))
+        if card is not None:
+            self.put({**card, **{field: value for field, value in changes.items() if field in self.fields}})
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "live": self.is_live(),
+            "entries": len(self._state),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,68 @@
+"""
+In-memory index of registered numbers by hash prefix, for hashed discovery.
+
+Clients send short prefixes of the SHA-256 of E.164 numbers (e164_hash())
+instead of the numbers. The server answers with every registered full hash
+under those prefixes, so it never learns which exact numbers a phonebook
+holds; the client keeps the hashes matching its own numbers and asks for
+those users' cards.
+
+The index holds each registered number's hash and profile id, grouped by
+prefix. It is built by ProfileIndexLoader and kept current with put() on
+profile creation, in this worker and, through the change stream, in the
+others.
+"""
+from typing import Any, Dict, Iterable, List
+
+from phone_keys import e164_hash, e164_number
+from profile_index import ProfileIndex
+
+
+class PhoneHashIndex(ProfileIndex):
+    fields = ("id", "phone", "country_code")
+
+    def __init__(self, prefix_length: int = 5):
+        self.prefix_length = prefix_length
+        super().__init__()
+
+    def _empty(self) -> Dict[str, Dict[str, str]]:
+        # prefix -> {full hash: profile id}
+        return {}
+
+    def _insert(self, state: Dict[str, Dict[str, str]], profile: Dict[str, Any]) -> None:
+        full_hash = e164_hash(e164_number(profile["phone"], profile["country_code"]))
+        state.setdefault(full_hash[:self.prefix_length], {})[full_hash] = profile["id"]
+
+    @property
+    def size(self) -> int:
+        return sum(len(bucket) for bucket in self._state.values())
+
+    def candidates(self, prefixes: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Registered full hashes under each prefix; prefixes without any are left out
+        """
+        found = {}
+        for prefix in prefixes:
+            bucket = self._state.get(prefix)
+            if bucket:
+                found[prefix] = sorted(bucket)
+        return found
+
+    def profile_ids(self, full_hashes: Iterable[str]) -> Dict[str, str]:
+        """
+        Profile id of each registered full hash; unknown hashes are left out
+        """
+        found = {}
+        for full_hash in full_hashes:
+            profile_id = self._state.get(full_hash[:self.prefix_length], {}).get(full_hash)
+            if profile_id:
+                found[full_hash] = profile_id
+        return found
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "phones": self.size,
+            "prefix_length": self.prefix_length,
+            "buckets": len(self._state),
+        }
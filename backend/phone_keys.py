@@ -0,0 +1,79 @@
+"""
+Canonical phone keys for matching numbers typed in any format.
+
+Profiles store the phone as typed (digits only, trunk zero kept or not) next
+to its country code, so "+33 6 12 34 56 78", "06 12 34 56 78" and
+"0033612345678" are different strings for the same line. The canonical key
+is the country code digits followed by the national number without leading
+zeros, e.g. "33612345678", and is stored on every profile as phone_key.
+
+Numbers written in international form ("+..." or "00...") do not say where
+the country code ends. Country calling codes are prefix-free and one to
+three digits long, so at most three splits are possible and
+phonebook_keys() returns each resulting key; only the real split can match
+a stored profile.
+
+The key is for matching only, it is not always the E.164 number: a few
+countries, such as Côte d'Ivoire, keep the leading 0 in their numbers
+(+225 07 12 34 56 78 is +2250712345678). Hashed discovery must agree with
+what clients compute from real E.164 numbers, so it identifies a number by
+e164_hash(e164_number(phone, country_code)), e.g. sha256("+2250712345678").
+"""
+import hashlib
+import re
+from typing import List
+
+_NON_DIGITS = re.compile(r'\D')
+
+# Country calling codes whose national numbers keep their leading 0 in E.164:
+# Italy, San Marino, Côte d'Ivoire, Benin and Congo
+_LEADING_ZERO_COUNTRY_CODES = frozenset({"39", "378", "225", "229", "242"})
+
+
+def canonical_phone_key(phone: str, country_code: str) -> str:
+    """
+    Key of a stored (phone, country_code) pair, both normalized as on profiles
+    """
+    return _NON_DIGITS.sub('', country_code) + _NON_DIGITS.sub('', phone).lstrip('0')
+
+
+def phonebook_keys(raw_phone: str, default_country_code: str) -> List[str]:
+    """
+    Candidate keys of a phonebook entry; national numbers use default_country_code
+    """
+    raw_phone = str(raw_phone).strip()
+    digits = _NON_DIGITS.sub('', raw_phone)
+    if raw_phone.startswith('+'):
+        international = digits
+    elif digits.startswith('00'):
+        international = digits[2:]
+    else:
+        national = digits.lstrip('0')
+        return [canonical_phone_key(national, default_country_code)] if national else []
+
+    keys = []
+    for split in range(1, 4):
+        country_digits, national = international[:split], international[split:].lstrip('0')
+        # Country codes never start with 0
+        if not national or country_digits.startswith('0'):
+            continue
+        key = country_digits + national
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def e164_number(phone: str, country_code: str) -> str:
+    """
+    E.164 form of a stored (phone, country_code) pair, e.g. "+33612345678"
+    """
+    country_digits = _NON_DIGITS.sub('', country_code)
+    national = _NON_DIGITS.sub('', phone)
+    if country_digits not in _LEADING_ZERO_COUNTRY_CODES:
+        # Drop the trunk prefix
+        national = national.lstrip('0')
+    return f"+{country_digits}{national}"
+
+
+def e164_hash(e164: str) -> str:
+    return hashlib.sha256(e164.encode()).hexdigest()
@@ -0,0 +1,123 @@
+"""
+In-memory indexes derived from user_profiles.
+
+A ProfileIndex holds some view of every profile (numbers by hash, cards by
+phone, ...). ProfileIndexLoader rebuilds all of them from a single scan of
+the collection and swaps each new state in at once. Profiles put() into an
+index while a rebuild runs are replayed onto the new state before the swap,
+so a write made during the scan is never lost. A load requested while one
+runs (e.g. after a deleted profile) makes it run again once it finishes.
+
+Without a live change stream, other workers' writes never reach these
+indexes, so the loader also rebuilds them every refresh_interval.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileIndex:
+    # Profile fields _insert() reads
+    fields: Iterable[str] = ()
+
+    def __init__(self):
+        self._state = self._empty()
+        # Profiles put while a rebuild runs, replayed onto the new state
+        self._put_during_load: Optional[List[Dict[str, Any]]] = None
+        self.ready = False
+
+    def _empty(self) -> Any:
+        raise NotImplementedError
+
+    def _insert(self, state: Any, profile: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def put(self, profile: Dict[str, Any]) -> None:
+        """
+        Add or replace a profile; it must have every field in `fields`
+        """
+        if self._put_during_load is not None:
+            self._put_during_load.append(profile)
+        self._insert(self._state, profile)
+
+
+class ProfileIndexLoader:
+    def __init__(self, collection, indexes: Iterable[ProfileIndex], refresh_interval: float = 300.0,
+                 is_live: Callable[[], bool] = lambda: False):
+        self.collection = collection
+        self.indexes = list(indexes)
+        self.refresh_interval = refresh_interval
+        self.is_live = is_live
+        self._loading = False
+        # Set when load() is called during a rebuild, which then runs once more
+        self._reload_pending = False
+        self.profiles = 0
+        self.load_seconds: Optional[float] = None
+
+    async def load(self, batch_size: int = 5000) -> int:
+        """
+        Rebuild every index from one scan of the collection; returns the number of profiles.
+        Called while a rebuild runs, it returns at once and has that rebuild run again.
+        """
+        if self._loading:
+            # The running scan may already be past the profiles this caller wants picked up
+            self._reload_pending = True
+            return self.profiles
+        self._loading = True
+        try:
+            while True:
+                self._reload_pending = False
+                await self._load(batch_size)
+                if not self._reload_pending:
+                    return self.profiles
+        finally:
+            self._loading = False
+
+    async def _load(self, batch_size: int) -> None:
+        started = time.monotonic()
+        states = [index._empty() for index in self.indexes]
+        for index in self.indexes:
+            index._put_during_load = []
+        try:
+            fields = {field for index in self.indexes for field in index.fields}
+            projection = {"_id": 0, **{field: 1 for field in fields}}
+            profiles = 0
+            async for profile in self.collection.find({}, projection).batch_size(batch_size):
+                for index, state in zip(self.indexes, states):
+                    index._insert(state, profile)
+                profiles += 1
+
+            for index, state in zip(self.indexes, states):
+                for profile in index._put_during_load:
+                    index._insert(state, profile)
+                index._state = state
+                index.ready = True
+        finally:
+            for index in self.indexes:
+                index._put_during_load = None
+
+        self.profiles = profiles
+        self.load_seconds = round(time.monotonic() - started, 3)
+
+    async def run(self) -> None:
+        """
+        Rebuild periodically while the change stream is not keeping the indexes current
+        """
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if self.is_live():
+                continue
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Error reloading profile indexes: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {
+            "profiles": self.profiles,
+            "load_seconds": self.load_seconds,
+            "live": self.is_live(),
+        }
@@ -0,0 +1,141 @@
+"""
+Access to user_profiles through named projections.
+
+Each call site asks for the view it needs instead of loading whole
+documents. Every write bumps the profile's version, which callers can use
+for optimistic concurrency.
+
+Profiles also carry phone_key, the canonical form of their number used by
+contact discovery (see phone_keys). It is internal and never projected.
+
+    auth  - identity only: id, phone, country_code and name
+    card  - what a contact card or search result shows
+    full  - every field of UserProfile
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from phone_keys import canonical_phone_key
+
+PROFILE_VIEWS = {
+    "auth": ("id", "phone", "country_code", "first_name", "last_name"),
+    "card": ("id", "phone", "country_code", "first_name", "last_name", "city", "country", "avatar_hash"),
+    "full": None,
+}
+
+# Never returned, whatever the view
+_EXCLUDED_FIELDS = {"_id": 0, "avatar_base64": 0, "phone_key": 0}
+
+# Keys per $in query in by_phone_keys
+PHONE_KEY_CHUNK_SIZE = 500
+
+
+def profile_projection(view: str) -> Dict[str, int]:
+    if view not in PROFILE_VIEWS:
+        raise ValueError(f"Unknown profile view: {view}")
+    fields = PROFILE_VIEWS[view]
+    if fields is None:
+        return dict(_EXCLUDED_FIELDS)
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    return projection
+
+
+class ProfileRepository:
+    def __init__(self, db):
+        self.collection = db.user_profiles
+
+    async def by_id(self, profile_id: str, view: str = "full") -> Optional[Dict]:
+        return await self.collection.find_one({"id": profile_id}, profile_projection(view))
+
+    async def by_phone(self, phone: str, country_code: str, view: str = "full") -> Optional[Dict]:
+        return await self.collection.find_one(
+            {"phone": phone, "country_code": country_code},
+            profile_projection(view)
+        )
+
+    async def by_ids(self, profile_ids: Iterable[str], view: str = "full") -> List[Dict]:
+        profile_ids = list(profile_ids)
+        if not profile_ids:
+            return []
+        cursor = self.collection.find({"id": {"$in": profile_ids}}, profile_projection(view))
+        return await cursor.to_list(len(profile_ids))
+
+    async def by_phone_keys(self, phone_keys: Iterable[str], view: str = "card") -> List[Dict]:
+        """
+        Profiles whose canonical phone key is in phone_keys, each with its phone_key,
+        fetched in chunks so no single $in grows unbounded
+        """
+        phone_keys = list(dict.fromkeys(phone_keys))
+        projection = profile_projection(view)
+        if PROFILE_VIEWS[view] is None:
+            projection.pop("phone_key")
+        else:
+            projection["phone_key"] = 1
+
+        profiles = []
+        for start in range(0, len(phone_keys), PHONE_KEY_CHUNK_SIZE):
+            chunk = phone_keys[start:start + PHONE_KEY_CHUNK_SIZE]
+            profiles += await self.collection.find({"phone_key": {"$in": chunk}}, projection).to_list(None)
+        return profiles
+
+    async def update(self, phone: str, country_code: str, changes: Dict[str, Any],
+                     expected_version: Optional[int] = None) -> Optional[Dict]:
+        """
+        Apply changes and bump the version in one round trip; returns the updated
+        document, or None if it does not exist or is no longer at expected_version
+        """
+        query = {"phone": phone, "country_code": country_code}
+        if expected_version is not None:
+            query["version"] = expected_version
+        return await self.collection.find_one_and_update(
+            query,
+            {"$set": changes, "$inc": {"version": 1}},
+            projection=profile_projection("full"),
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def patch(self, phone: str, country_code: str, changes: Dict[str, Any],
+                    expected_version: Optional[int] = None) -> Optional[int]:
+        """
+        Like update(), but only returns the new version instead of the whole profile
+        """
+        query = {"phone": phone, "country_code": country_code}
+        if expected_version is not None:
+            query["version"] = expected_version
+        updated = await self.collection.find_one_and_update(
+            query,
+            {"$set": changes, "$inc": {"version": 1}},
+            projection={"_id": 0, "version": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return updated["version"] if updated else None
+
+    async def backfill_versions(self) -> int:
+        """
+        Give profiles created before versioning their first version
+        """
+        result = await self.collection.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        return result.modified_count
+
+    async def backfill_phone_keys(self, batch_size: int = 1000) -> int:
+        """
+        Compute phone_key on profiles created before contact discovery
+        """
+        backfilled = 0
+        while True:
+            profiles = await self.collection.find(
+                {"phone_key": {"$exists": False}},
+                {"_id": 1, "phone": 1, "country_code": 1}
+            ).to_list(batch_size)
+            if not profiles:
+                return backfilled
+            await self.collection.bulk_write([
+                UpdateOne(
+                    {"_id": profile["_id"]},
+                    {"$set": {"phone_key": canonical_phone_key(profile["phone"], profile["country_code"])}}
+                )
+                for profile in profiles
+            ], ordered=False)
+            backfilled += len(profiles)
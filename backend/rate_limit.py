@@ -0,0 +1,118 @@
+"""
+In-process token-bucket rate limiting for unauthenticated endpoints.
+
+Buckets are spread over shards, each an OrderedDict kept in last-access
+order, so idle buckets are evicted from the front of a shard in amortized
+O(1) per request.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate: float, capacity: float, shards: int = 16,
+                 idle_seconds: float = 600.0, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        # key -> [tokens, last_refill]
+        self._shards: List["OrderedDict[str, List[float]]"] = [OrderedDict() for _ in range(shards)]
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def allow(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take `cost` tokens from the bucket of `key`.
+        Returns (allowed, seconds until enough tokens are available).
+        """
+        retry_after = self.wait(key, cost)
+        if retry_after > 0:
+            return False, retry_after
+        self.take(key, cost)
+        return True, 0.0
+
+    def wait(self, key: str, cost: float = 1.0) -> float:
+        """
+        Seconds until the bucket of `key` holds `cost` tokens, 0 if it does now.
+        Takes nothing; a non-zero wait counts as a rejection.
+        """
+        bucket = self._bucket(key)
+        if bucket[0] >= cost:
+            return 0.0
+        self.rejected += 1
+        return (cost - bucket[0]) / self.rate
+
+    def take(self, key: str, cost: float = 1.0) -> None:
+        """
+        Take `cost` tokens from the bucket of `key`, once wait() allowed it
+        """
+        self._bucket(key)[0] -= cost
+        self.allowed += 1
+
+    def _bucket(self, key: str) -> List[float]:
+        # Refilled bucket of key, created full and moved to the end of its shard
+        now = self._clock()
+        shard = self._shards[hash(key) % len(self._shards)]
+        self._evict_idle(shard, now)
+
+        bucket = shard.get(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            shard[key] = bucket
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            shard.move_to_end(key)
+        return bucket
+
+    def _evict_idle(self, shard: "OrderedDict[str, List[float]]", now: float) -> None:
+        # Least recently used buckets sit at the front of the shard
+        while shard:
+            key, bucket = next(iter(shard.items()))
+            if now - bucket[1] < self.idle_seconds:
+                break
+            del shard[key]
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "buckets": sum(len(shard) for shard in self._shards),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+        }
+
+
+class RateLimiter:
+    """
+    A set of named scopes (e.g. "phone", "ip", "global"), each with its own buckets.
+    """
+    def __init__(self, scopes: Dict[str, TokenBucketLimiter]):
+        self.scopes = scopes
+
+    def check(self, **keys: Optional[str]) -> Tuple[bool, float]:
+        """
+        Charge every scope that has a key, plus the global scope which takes no
+        key, only if all of them allow the request. A rejected request charges
+        nothing and reports the longest wait.
+        """
+        charges = [(self.scopes[scope], key) for scope, key in keys.items()
+                   if key is not None and scope in self.scopes and scope != "global"]
+        if "global" in self.scopes:
+            charges.append((self.scopes["global"], "global"))
+
+        retry_after = max((limiter.wait(key) for limiter, key in charges), default=0.0)
+        if retry_after > 0:
+            return False, retry_after
+
+        for limiter, key in charges:
+            limiter.take(key)
+        return True, 0.0
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {scope: limiter.stats() for scope, limiter in self.scopes.items()}
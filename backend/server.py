@@ -1,21 +1,50 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Header, Body
+from fastapi.responses import ORJSONResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError, computed_field
+from typing import Any, Dict, List, Optional, Tuple, Union
 import uuid
 from datetime import datetime, timedelta
 import random
 import string
 import re
+import math
+import asyncio
+import hashlib
+from urllib.parse import urlencode
 
 # GetStream imports
 from stream_chat import StreamChat
 
+from avatar_images import (
+    AvatarProcessor, AVATAR_SIZES, MAX_INITIALS_NAME_LENGTH, normalize_initials_name, render_initials_svg
+)
+from avatar_store import (
+    create_avatar_store, decode_avatar, migrate_inline_avatars, save_avatar, variant_key,
+    InvalidAvatar, AvatarTooLarge, AVATAR_HASH_PATTERN
+)
+from change_watcher import ChangeWatcher
+from collection_versions import CollectionVersions, contacts_key, channels_key
+from indexes import ensure_indexes, VERIFIED_SESSION_LIFETIME
+from pagination import keyset_page, InvalidCursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from phone_directory import PhoneDirectory
+from phone_hash_index import PhoneHashIndex
+from profile_index import ProfileIndexLoader
+from phone_keys import canonical_phone_key, phonebook_keys
+from profile_repository import ProfileRepository, PROFILE_VIEWS
+from rate_limit import RateLimiter, TokenBucketLimiter
+from session_cache import SessionCache
+from session_store import create_session_store
+from session_activity import LastSeenTracker
+from session_janitor import SessionJanitor
+from sms_dispatch import SmsDispatcher, MockSmsGateway
+from session_tokens import SessionTokenCodec, RevocationList, looks_like_token
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -31,8 +60,158 @@ STREAM_API_SECRET = os.environ['STREAM_API_SECRET']
 STREAM_APP_ID = os.environ['STREAM_APP_ID']
 stream_client = StreamChat(api_key=STREAM_API_KEY, api_secret=STREAM_API_SECRET)
 
+# Projected reads of user_profiles
+profile_repository = ProfileRepository(db)
+
+# Version counters behind the contacts and channels ETags
+collection_versions = CollectionVersions(db)
+
+# Avatar blob store: gridfs (default) or filesystem
+avatar_store = create_avatar_store(
+    os.environ.get('AVATAR_STORE', 'gridfs'),
+    db=db,
+    path=os.environ.get('AVATAR_STORE_PATH', str(ROOT_DIR / 'avatars'))
+)
+avatar_processor = AvatarProcessor(max_workers=int(os.environ.get('AVATAR_WORKERS', '2')))
+MAX_AVATAR_BYTES = int(os.environ.get('MAX_AVATAR_BYTES', str(5 * 1024 * 1024)))
+
+# Most profile ids accepted by one POST /api/users/batch
+MAX_BATCH_PROFILE_IDS = int(os.environ.get('MAX_BATCH_PROFILE_IDS', '500'))
+
+# Most phonebook entries accepted by one POST /api/users/discover
+MAX_DISCOVER_PHONES = int(os.environ.get('MAX_DISCOVER_PHONES', '5000'))
+
+HEX_DIGEST = re.compile(r'[0-9a-f]+')
+
+# Session storage backend: mongo (default), memory or redis
+session_store = create_session_store(
+    os.environ.get('SESSION_STORE', 'mongo'),
+    db=db,
+    redis_url=os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+)
+
+# Sliding session expiry: last-seen times are flushed to the store in bulk
+session_activity = LastSeenTracker(
+    session_store,
+    VERIFIED_SESSION_LIFETIME,
+    flush_interval=float(os.environ.get('SESSION_ACTIVITY_FLUSH_SECONDS', '5'))
+)
+
+# Periodic cleanup of expired and abandoned sessions
+session_janitor = SessionJanitor(
+    session_store,
+    interval=float(os.environ.get('SESSION_JANITOR_INTERVAL_SECONDS', '300')),
+    batch_size=int(os.environ.get('SESSION_JANITOR_BATCH_SIZE', '1000'))
+)
+
+# In-process cache of verified sessions and their profiles
+session_cache = SessionCache(
+    max_entries=int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=float(os.environ.get('SESSION_CACHE_TTL_SECONDS', '60'))
+)
+
+# Writes made by other workers invalidate this worker's caches through a change stream
+CHANGE_STREAMS_ENABLED = os.environ.get('CHANGE_STREAMS_ENABLED', 'true').lower() == 'true'
+change_watcher = ChangeWatcher(db, name=os.environ.get('CHANGE_STREAM_NAME', 'cache-invalidation'))
+
+def invalidate_profile_change(change):
+    profile = change.get("fullDocument")
+    if profile and "phone" in profile:
+        session_cache.invalidate_phone(profile["phone"], profile["country_code"])
+    else:
+        # Deleted profiles no longer say whose they were
+        session_cache.clear()
+
+def invalidate_session_change(change):
+    # Sessions created before _id doubled as the session id just age out of the cache
+    session_id = change["documentKey"]["_id"]
+    if isinstance(session_id, str):
+        session_cache.invalidate(session_id)
+
+change_watcher.subscribe("user_profiles", invalidate_profile_change, fields=("phone", "country_code"))
+change_watcher.subscribe("user_sessions", invalidate_session_change, operations=["delete"])
+change_watcher.on_reset(session_cache.clear)
+
+# Registered numbers by hash prefix, for POST /api/users/discover/hashed
+phone_hash_index = PhoneHashIndex(prefix_length=int(os.environ.get('PHONE_HASH_PREFIX_LENGTH', '5')))
+
+# Contact cards by phone for search and add-contact, answered without a database round trip
+phone_directory = PhoneDirectory(PROFILE_VIEWS["card"], is_live=lambda: change_watcher.active)
+
+# Both are built from one scan of user_profiles
+profile_indexes = ProfileIndexLoader(
+    db.user_profiles,
+    [phone_hash_index, phone_directory],
+    refresh_interval=float(os.environ.get('PROFILE_INDEX_REFRESH_SECONDS', '300')),
+    is_live=lambda: change_watcher.active
+)
+
+async def load_profile_indexes():
+    try:
+        profiles = await profile_indexes.load()
+        logger.info(f"Profile indexes loaded from {profiles} profiles in {profile_indexes.load_seconds}s")
+    except Exception as e:
+        logger.error(f"Error loading profile indexes: {str(e)}")
+
+def schedule_profile_index_load():
+    background_tasks.append(asyncio.create_task(load_profile_indexes()))
+
+def refresh_profile_indexes(change):
+    profile = change.get("fullDocument")
+    if profile and "phone" in profile:
+        phone_directory.put(profile)
+        if change["operationType"] == "insert":
+            phone_hash_index.put(profile)
+    else:
+        # Deleted profiles no longer say whose they were
+        schedule_profile_index_load()
+
+change_watcher.subscribe("user_profiles", refresh_profile_indexes, fields=PROFILE_VIEWS["card"])
+# Writes may have been missed, rebuild from the collection
+change_watcher.on_reset(schedule_profile_index_load)
+
+# Signed session tokens (SESSION_TOKEN_MODE=jwt), validated without a Mongo lookup
+SESSION_TOKEN_MODE = os.environ.get('SESSION_TOKEN_MODE', 'opaque')
+session_token_codec = SessionTokenCodec(os.environ['SESSION_TOKEN_SECRET']) if SESSION_TOKEN_MODE == 'jwt' else None
+revocation_list = RevocationList(
+    db,
+    refresh_interval=float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '30'))
+)
+
+# Rate limits for unauthenticated endpoints (rate in tokens/second, capacity = burst)
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# Reverse proxies in front of the app (e.g. 1 behind the ingress); 0 ignores X-Forwarded-For
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+send_code_rate_limiter = RateLimiter({
+    "phone": TokenBucketLimiter(rate=5 / 600, capacity=5),
+    "ip": TokenBucketLimiter(rate=0.5, capacity=30),
+    "global": TokenBucketLimiter(rate=100, capacity=200)
+})
+user_search_rate_limiter = RateLimiter({
+    "phone": TokenBucketLimiter(rate=1, capacity=10),
+    "ip": TokenBucketLimiter(rate=2, capacity=60),
+    "global": TokenBucketLimiter(rate=200, capacity=500)
+})
+# One discover request checks a whole phonebook, so far fewer are allowed
+user_discover_rate_limiter = RateLimiter({
+    "phone": TokenBucketLimiter(rate=1 / 600, capacity=5),
+    "ip": TokenBucketLimiter(rate=1 / 60, capacity=20),
+    "global": TokenBucketLimiter(rate=20, capacity=50)
+})
+
+# Outbound SMS pipeline, the mock gateway only logs messages
+sms_dispatcher = SmsDispatcher(
+    MockSmsGateway(),
+    queue_size=int(os.environ.get('SMS_QUEUE_SIZE', '10000')),
+    batch_size=int(os.environ.get('SMS_BATCH_SIZE', '50')),
+    max_concurrency=int(os.environ.get('SMS_MAX_CONCURRENCY', '4'))
+)
+
+# Long-running tasks started with the app and cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -105,12 +284,18 @@ class UserProfile(BaseModel):
     city: Optional[str] = None
     country: Optional[str] = None
     occupation: Optional[str] = None
-    avatar_base64: Optional[str] = None  # Base64 encoded image
+    avatar_hash: Optional[str] = None  # Content hash of the image in the avatar store
     language: str = "fr"  # Default to French
     currency: str = "FCFA"  # Default currency
     has_completed_tutorial: bool = False
+    version: int = 1  # Incremented on every update
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    @computed_field
+    @property
+    def avatar_url(self) -> Optional[str]:
+        return f"/api/avatar/{self.avatar_hash}" if self.avatar_hash else None
 
 # Network Models
 class NetworkMember(BaseModel):
@@ -153,10 +338,225 @@ class UserProfileUpdate(BaseModel):
     currency: Optional[str] = None
     has_completed_tutorial: Optional[bool] = None
 
+# Fields a PATCH may change; the avatar goes through PUT, which stores the image
+PATCHABLE_PROFILE_FIELDS = set(UserProfileUpdate.model_fields) - {"avatar_base64"}
+
+class ProfilePatchResponse(BaseModel):
+    success: bool
+    message: str
+    changes: Dict[str, Any] = {}
+    version: Optional[int] = None
+
 class ProfileResponse(BaseModel):
     success: bool
     message: str
-    profile: Optional[UserProfile] = None
+    # A dict when only some fields were requested
+    profile: Optional[Union[Dict[str, Any], UserProfile]] = None
+
+def select_profile_fields(profile: UserProfile, fields: str) -> Dict[str, Any]:
+    """
+    Keep only the requested fields: a view name (auth, card, full) or a comma-separated list
+    """
+    if fields in PROFILE_VIEWS:
+        names = set(PROFILE_VIEWS[fields] or UserProfile.model_fields)
+        if "avatar_hash" in names:
+            names.add("avatar_url")
+    else:
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = names - set(UserProfile.model_fields) - {"avatar_url"}
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Champs inconnus: {', '.join(sorted(unknown))}")
+    return profile.dict(include=names)
+
+def profile_etag(profile_id: str, version: int) -> str:
+    return f'"{profile_id}-{version}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Expected profile version from an If-Match header: a profile ETag or a bare version number
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"').split(".")[0].rsplit("-", 1)[-1])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="En-tête If-Match invalide")
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque_tag:
+            return True
+    return False
+
+def revalidation_headers(etag: str) -> Dict[str, str]:
+    """
+    Let clients keep the body but revalidate it on every use
+    """
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=revalidation_headers(etag))
+
+def trusted_response(content: Union[BaseModel, Dict[str, Any]], headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """
+    Serialize a response built from our own data straight to JSON, skipping
+    FastAPI's second validation against response_model and jsonable_encoder
+    """
+    if isinstance(content, BaseModel):
+        content = content.model_dump()
+    return ORJSONResponse(content, headers=headers)
+
+def check_page_size(limit: int) -> None:
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Le paramètre limit doit être compris entre 1 et {MAX_PAGE_SIZE}")
+
+async def fetch_page(collection, query: Dict[str, Any], sort_field: str, limit: int, cursor: Optional[str],
+                     projection: Optional[Dict[str, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    try:
+        return await keyset_page(collection, query, sort_field, limit, cursor, projection)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+def page_etag(key: str, version: int, limit: int, cursor: Optional[str]) -> str:
+    """
+    Weak ETag of one page of a versioned list
+    """
+    return f'W/"{key}-{version}.{limit}.{cursor or ""}"'
+
+async def bump_contact_lists(profile_id: str) -> None:
+    """
+    Invalidate the contacts ETag of every user who has this profile as a contact
+    """
+    owners = await db.user_contacts.distinct("user_id", {"contact_id": profile_id})
+    await collection_versions.bump(contacts_key(owner) for owner in owners)
+
+async def store_avatar(avatar_base64: str) -> str:
+    """
+    Decode an uploaded base64 avatar, transcode it, store its variants and return its hash
+    """
+    try:
+        data, _ = decode_avatar(avatar_base64, max_bytes=MAX_AVATAR_BYTES)
+        return await save_avatar(avatar_store, data, avatar_processor.transcode)
+    except AvatarTooLarge:
+        raise HTTPException(status_code=413, detail="Image de profil trop volumineuse")
+    except InvalidAvatar:
+        raise HTTPException(status_code=400, detail="Image de profil invalide")
+
+# Session resolution shared by every authenticated endpoint
+def session_from_token(token: str) -> Tuple[Optional[UserSession], Optional[str]]:
+    """
+    Validate a signed session token locally and rebuild the session it carries,
+    along with the profile id of tokens issued after profile creation
+    """
+    claims = session_token_codec.decode(token)
+    if not claims or revocation_list.is_revoked(claims["sid"]):
+        return None, None
+    
+    session = UserSession(
+        id=claims["sid"],
+        phone=claims["phone"],
+        country_code=claims["cc"],
+        verification_code="",
+        is_verified=True,
+        created_at=datetime.utcfromtimestamp(claims["iat"]),
+        expires_at=datetime.utcfromtimestamp(claims["exp"])
+    )
+    return session, claims.get("pid")
+
+async def resolve_session(session_id: str) -> Tuple[UserSession, Optional[UserProfile]]:
+    """
+    Resolve a verified session and its profile (None if not created yet).
+    Accepts raw session ids and signed tokens, and is served from the
+    in-process session cache when possible. Every hit on a raw session
+    slides its expiry forward.
+    """
+    session = None
+    token = None
+    profile_id = None
+    if session_token_codec and looks_like_token(session_id):
+        token = session_id
+        session, profile_id = session_from_token(token)
+        if not session:
+            raise HTTPException(status_code=401, detail="Session invalide")
+        session_id = session.id
+    
+    cached = session_cache.get(session_id)
+    if cached is not None:
+        session, profile = cached
+        return renew_session(session, sliding=token is None), profile
+    
+    if session is None:
+        session_data = await session_store.get_verified(session_id)
+        
+        if not session_data:
+            raise HTTPException(status_code=401, detail="Session invalide")
+        
+        session = UserSession.model_construct(**session_data)
+    
+    # Tokens issued after profile creation carry the profile id
+    if profile_id:
+        profile_data = await profile_repository.by_id(profile_id)
+    else:
+        profile_data = await profile_repository.by_phone(session.phone, session.country_code)
+    profile = UserProfile.model_construct(**profile_data) if profile_data else None
+    
+    session_cache.put(session_id, session, profile)
+    return renew_session(session, sliding=token is None), profile
+
+def renew_session(session: UserSession, sliding: bool) -> UserSession:
+    """
+    Reject expired sessions and slide the expiry of raw sessions in memory.
+    Signed tokens keep the expiry they were issued with.
+    """
+    now = datetime.utcnow()
+    if now > session.expires_at:
+        session_cache.invalidate(session.id)
+        raise HTTPException(status_code=401, detail="Session expirée")
+    
+    if not sliding:
+        return session
+    
+    session.expires_at = now + VERIFIED_SESSION_LIFETIME
+    session_activity.touch(session.id, now)
+    return session
+
+# Rate limiting helpers
+def client_ip(http_request: Request) -> str:
+    """
+    Client address. X-Forwarded-For is only read behind TRUSTED_PROXY_COUNT
+    proxies, each appending the address it received the request from, so the
+    client is that many hops from the end; earlier hops are client-supplied.
+    """
+    if TRUSTED_PROXY_COUNT > 0:
+        hops = [hop.strip() for hop in http_request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_COUNT:
+            return hops[-TRUSTED_PROXY_COUNT]
+    return http_request.client.host if http_request.client else "unknown"
+
+def enforce_rate_limit(limiter: RateLimiter, http_request: Request, phone_key: str) -> None:
+    if not RATE_LIMIT_ENABLED:
+        return
+    allowed, retry_after = limiter.check(phone=phone_key, ip=client_ip(http_request))
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Trop de requêtes, veuillez réessayer plus tard",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
 
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
@@ -171,43 +571,55 @@ async def create_status_check(input: StatusCheckCreate):
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
+async def get_status_checks(response: Response, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """
+    Status checks oldest first; the next page's cursor is in the X-Next-Cursor header
+    """
+    check_page_size(limit)
+    status_checks, next_cursor = await fetch_page(db.status_checks, {}, "timestamp", limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [StatusCheck(**status_check) for status_check in status_checks]
 
 # Authentication endpoints
 @api_router.post("/auth/send-code", response_model=AuthResponse)
-async def send_verification_code(request: PhoneAuthRequest):
+async def send_verification_code(request: PhoneAuthRequest, http_request: Request):
     """
-    Simulate sending SMS verification code.
-    In reality, this would integrate with an SMS service.
+    Send an SMS verification code.
+    The message is queued for the SMS dispatcher; the request does not wait for delivery.
     """
+    # Normalize phone number and country code
+    normalized_phone = normalize_phone(request.phone)
+    normalized_country_code = normalize_country_code(request.country_code)
+    
+    enforce_rate_limit(send_code_rate_limiter, http_request, f"{normalized_country_code}{normalized_phone}")
+    
     try:
-        # Normalize phone number and country code
-        normalized_phone = normalize_phone(request.phone)
-        normalized_country_code = normalize_country_code(request.country_code)
-        
         # Generate a random 6-digit code
         verification_code = ''.join(random.choices(string.digits, k=6))
         
-        # Create or update user session
+        # Create or refresh the pending session for this phone in one atomic step
         session = UserSession(
             phone=normalized_phone,
             country_code=normalized_country_code,
             verification_code=verification_code,
             is_verified=False
         )
+        session.id = await session_store.issue_code(session.dict())
         
-        # Remove any existing session for this phone
-        await db.user_sessions.delete_many({
-            "phone": normalized_phone,
-            "country_code": normalized_country_code
-        })
-        
-        # Save new session
-        await db.user_sessions.insert_one(session.dict())
+        queued = sms_dispatcher.enqueue(
+            f"{normalized_country_code}{normalized_phone}",
+            f"Votre code de vérification est {verification_code}"
+        )
+        if not queued:
+            # The pending session stays; a retry refreshes its code
+            raise HTTPException(
+                status_code=503,
+                detail="Service SMS surchargé, veuillez réessayer",
+                headers={"Retry-After": "5"}
+            )
         
-        logger.info(f"Generated verification code {verification_code} for {normalized_country_code}{normalized_phone}")
+        logger.info(f"Queued verification code for {normalized_country_code}{normalized_phone}")
         
         return AuthResponse(
             success=True,
@@ -215,6 +627,8 @@ async def send_verification_code(request: PhoneAuthRequest):
             session_id=session.id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error sending verification code: {str(e)}")
         raise HTTPException(status_code=500, detail="Erreur lors de l'envoi du code")
@@ -236,41 +650,53 @@ async def verify_code(request: VerifyCodeRequest):
                 message="Le code doit contenir exactement 6 chiffres"
             )
         
-        # Find active session for this phone
-        session_data = await db.user_sessions.find_one({
-            "phone": normalized_phone,
-            "country_code": normalized_country_code,
-            "is_verified": False
-        })
+        # Atomically mark the pending, unexpired session as verified
+        # (valid for 24 hours from now)
+        now = datetime.utcnow()
+        verify = session_store.verify(
+            normalized_phone,
+            normalized_country_code,
+            now,
+            now + VERIFIED_SESSION_LIFETIME
+        )
+        if session_token_codec:
+            # Fetch the profile id for the token concurrently
+            session_data, profile_data = await asyncio.gather(
+                verify,
+                profile_repository.by_phone(normalized_phone, normalized_country_code, view="auth")
+            )
+        else:
+            session_data, profile_data = await verify, None
         
         if not session_data:
+            # Slow path only: tell an expired code from a missing session
+            if await session_store.has_pending(normalized_phone, normalized_country_code):
+                return AuthResponse(
+                    success=False,
+                    message="Code expiré, veuillez demander un nouveau code"
+                )
             return AuthResponse(
                 success=False,
                 message="Session non trouvée ou expirée"
             )
         
-        session = UserSession(**session_data)
+        logger.info(f"Successfully verified code for {normalized_country_code}{normalized_phone}")
         
-        # Check if session is expired
-        if datetime.utcnow() > session.expires_at:
-            await db.user_sessions.delete_one({"id": session.id})
-            return AuthResponse(
-                success=False,
-                message="Code expiré, veuillez demander un nouveau code"
+        session_id = session_data["id"]
+        if session_token_codec:
+            session_id = session_token_codec.issue(
+                session_data["id"],
+                normalized_phone,
+                normalized_country_code,
+                profile_data["id"] if profile_data else None,
+                now,
+                now + VERIFIED_SESSION_LIFETIME
             )
         
-        # Mark session as verified
-        await db.user_sessions.update_one(
-            {"id": session.id},
-            {"$set": {"is_verified": True}}
-        )
-        
-        logger.info(f"Successfully verified code for {normalized_country_code}{normalized_phone}")
-        
         return AuthResponse(
             success=True,
             message="Connexion réussie",
-            session_id=session.id
+            session_id=session_id
         )
         
     except Exception as e:
@@ -283,20 +709,22 @@ async def check_session(session_id: str):
     Check if a session is valid and verified
     """
     try:
-        session_data = await db.user_sessions.find_one({
-            "id": session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            return {"valid": False, "message": "Session invalide"}
-        
-        session = UserSession(**session_data)
+        # Signed tokens are validated locally
+        if session_token_codec and looks_like_token(session_id):
+            session, _ = session_from_token(session_id)
+            if not session:
+                return {"valid": False, "message": "Session invalide"}
+            return {
+                "valid": True,
+                "phone": session.phone,
+                "country_code": session.country_code
+            }
         
-        # Check if session is expired (extend to 24 hours for verified sessions)
-        if datetime.utcnow() > (session.created_at + timedelta(hours=24)):
-            await db.user_sessions.delete_one({"id": session_id})
-            return {"valid": False, "message": "Session expirée"}
+        # Expired sessions are rejected by resolve_session (the TTL index purges the document)
+        try:
+            session, _ = await resolve_session(session_id)
+        except HTTPException as e:
+            return {"valid": False, "message": e.detail}
         
         return {
             "valid": True,
@@ -308,32 +736,47 @@ async def check_session(session_id: str):
         logger.error(f"Error checking session: {str(e)}")
         return {"valid": False, "message": "Erreur serveur"}
 
+@api_router.post("/auth/logout/{session_id}")
+async def logout(session_id: str):
+    """
+    End a session. Signed tokens are revoked until their expiry.
+    """
+    try:
+        if session_token_codec and looks_like_token(session_id):
+            session, _ = session_from_token(session_id)
+            if not session:
+                return {"success": True, "message": "Déconnexion réussie"}
+            await revocation_list.revoke(session.id, session.expires_at)
+            session_id = session.id
+        
+        await session_store.delete(session_id)
+        session_cache.invalidate(session_id)
+        
+        return {"success": True, "message": "Déconnexion réussie"}
+        
+    except Exception as e:
+        logger.error(f"Error logging out: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la déconnexion")
+
 # User Profile endpoints
 @api_router.post("/profile/create", response_model=ProfileResponse)
-async def create_user_profile(request: UserProfileCreate, session_id: str):
+async def create_user_profile(
+    request: UserProfileCreate,
+    auth: Tuple[UserSession, Optional[UserProfile]] = Depends(resolve_session)
+):
     """
     Create a user profile after authentication
     """
     try:
-        # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
-        
-        session = UserSession(**session_data)
+        session, cached_profile = auth
         
         # Check if profile already exists (with normalized phone data)
         normalized_phone = normalize_phone(session.phone)
         normalized_country_code = normalize_country_code(session.country_code)
         
-        existing_profile = await db.user_profiles.find_one({
-            "phone": normalized_phone,
-            "country_code": normalized_country_code
-        })
+        existing_profile = cached_profile or await profile_repository.by_phone(
+            normalized_phone, normalized_country_code, view="auth"
+        )
         
         if existing_profile:
             return ProfileResponse(
@@ -343,6 +786,9 @@ async def create_user_profile(request: UserProfileCreate, session_id: str):
         
         # Create new profile with normalized phone data
         profile_data = request.dict()
+        avatar_base64 = profile_data.pop("avatar_base64")
+        if avatar_base64:
+            profile_data["avatar_hash"] = await store_avatar(avatar_base64)
         profile_data.update({
             "id": str(uuid.uuid4()),
             "phone": normalized_phone,
@@ -352,7 +798,11 @@ async def create_user_profile(request: UserProfileCreate, session_id: str):
         })
         
         profile = UserProfile(**profile_data)
-        await db.user_profiles.insert_one(profile.dict())
+        phone_key = canonical_phone_key(normalized_phone, normalized_country_code)
+        await db.user_profiles.insert_one({**profile.dict(exclude={"avatar_url"}), "phone_key": phone_key})
+        phone_hash_index.put(profile_data)
+        phone_directory.put(profile_data)
+        session_cache.invalidate_phone(session.phone, session.country_code)
         
         logger.info(f"Created profile for {session.country_code}{session.phone}")
         
@@ -369,41 +819,35 @@ async def create_user_profile(request: UserProfileCreate, session_id: str):
         raise HTTPException(status_code=500, detail="Erreur lors de la création du profil")
 
 @api_router.get("/profile/{session_id}", response_model=ProfileResponse)
-async def get_user_profile(session_id: str):
+async def get_user_profile(
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    auth: Tuple[UserSession, Optional[UserProfile]] = Depends(resolve_session)
+):
     """
-    Get user profile by session ID
+    Get user profile by session ID, optionally only some fields (e.g. ?fields=card).
+    Answers 304 when the client already has this version.
     """
     try:
-        # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
-        
-        session = UserSession(**session_data)
-        
-        # Get profile
-        profile_data = await db.user_profiles.find_one({
-            "phone": session.phone,
-            "country_code": session.country_code
-        })
+        _, profile = auth
         
-        if not profile_data:
+        if not profile:
             return ProfileResponse(
                 success=False,
                 message="Profil non trouvé"
             )
         
-        profile = UserProfile(**profile_data)
+        etag = f'W/{profile_etag(profile.id, profile.version)}'
+        if fields:
+            etag = f'W/"{profile.id}-{profile.version}.{fields.replace(",", "+")}"'
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
         
-        return ProfileResponse(
+        return trusted_response(ProfileResponse.model_construct(
             success=True,
             message="Profil récupéré avec succès",
-            profile=profile
-        )
+            profile=select_profile_fields(profile, fields) if fields else profile
+        ), headers=revalidation_headers(etag))
         
     except HTTPException:
         raise
@@ -412,55 +856,60 @@ async def get_user_profile(session_id: str):
         raise HTTPException(status_code=500, detail="Erreur lors de la récupération du profil")
 
 @api_router.put("/profile/{session_id}", response_model=ProfileResponse)
-async def update_user_profile(session_id: str, request: UserProfileUpdate):
+async def update_user_profile(
+    request: UserProfileUpdate,
+    if_match: Optional[str] = Header(None),
+    auth: Tuple[UserSession, Optional[UserProfile]] = Depends(resolve_session)
+):
     """
-    Update user profile
+    Update user profile. With If-Match, the update only applies if the
+    profile is still at that version (412 otherwise).
     """
     try:
-        # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
-        
-        session = UserSession(**session_data)
-        
-        # Get existing profile
-        existing_profile = await db.user_profiles.find_one({
-            "phone": session.phone,
-            "country_code": session.country_code
-        })
+        session, existing_profile = auth
         
         if not existing_profile:
             raise HTTPException(status_code=404, detail="Profil non trouvé")
         
+        expected_version = parse_if_match(if_match)
+        
         # Update profile
         update_data = {k: v for k, v in request.dict().items() if v is not None}
+        if "avatar_base64" in update_data:
+            # An empty string removes the avatar
+            avatar_base64 = update_data.pop("avatar_base64")
+            update_data["avatar_hash"] = await store_avatar(avatar_base64) if avatar_base64 else None
         update_data["updated_at"] = datetime.utcnow()
         
-        await db.user_profiles.update_one(
-            {"phone": session.phone, "country_code": session.country_code},
-            {"$set": update_data}
+        updated_profile_data = await profile_repository.update(
+            session.phone,
+            session.country_code,
+            update_data,
+            expected_version=expected_version
         )
+        session_cache.invalidate_phone(session.phone, session.country_code)
+        
+        if not updated_profile_data:
+            if expected_version is not None:
+                raise HTTPException(
+                    status_code=412,
+                    detail="Le profil a été modifié sur un autre appareil, veuillez recharger"
+                )
+            raise HTTPException(status_code=404, detail="Profil non trouvé")
         
-        # Get updated profile
-        updated_profile_data = await db.user_profiles.find_one({
-            "phone": session.phone,
-            "country_code": session.country_code
-        })
-        
-        updated_profile = UserProfile(**updated_profile_data)
+        phone_directory.put(updated_profile_data)
+        updated_profile = UserProfile.model_construct(**updated_profile_data)
+        # Contact cards only show the card fields
+        if any(getattr(existing_profile, field) != getattr(updated_profile, field) for field in PROFILE_VIEWS["card"]):
+            await bump_contact_lists(updated_profile.id)
         
         logger.info(f"Updated profile for {session.country_code}{session.phone}")
         
-        return ProfileResponse(
+        return trusted_response(ProfileResponse.model_construct(
             success=True,
             message="Profil mis à jour avec succès",
             profile=updated_profile
-        )
+        ), headers={"ETag": profile_etag(updated_profile.id, updated_profile.version)})
         
     except HTTPException:
         raise
@@ -468,23 +917,139 @@ async def update_user_profile(session_id: str, request: UserProfileUpdate):
         logger.error(f"Error updating profile: {str(e)}")
         raise HTTPException(status_code=500, detail="Erreur lors de la mise à jour du profil")
 
+@api_router.patch("/profile/{session_id}", response_model=ProfilePatchResponse)
+async def patch_user_profile(
+    patch: Dict[str, Any] = Body(..., media_type="application/merge-patch+json"),
+    if_match: Optional[str] = Header(None),
+    auth: Tuple[UserSession, Optional[UserProfile]] = Depends(resolve_session)
+):
+    """
+    Change a few profile fields with a JSON merge patch (null clears an optional field).
+    Returns only the changed fields and the new version, without reloading the profile.
+    """
+    try:
+        session, existing_profile = auth
+        
+        if not existing_profile:
+            raise HTTPException(status_code=404, detail="Profil non trouvé")
+        
+        if not patch:
+            raise HTTPException(status_code=400, detail="Aucun champ à modifier")
+        unknown = set(patch) - PATCHABLE_PROFILE_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Champs non modifiables: {', '.join(sorted(unknown))}")
+        not_nullable = {
+            name for name, value in patch.items()
+            if value is None and UserProfile.model_fields[name].default is not None
+        }
+        if not_nullable:
+            raise HTTPException(status_code=400, detail=f"Champs obligatoires: {', '.join(sorted(not_nullable))}")
+        try:
+            changes = UserProfileUpdate.model_validate(patch).model_dump(include=set(patch))
+        except ValidationError:
+            raise HTTPException(status_code=400, detail="Valeurs invalides")
+        
+        expected_version = parse_if_match(if_match)
+        changes["updated_at"] = datetime.utcnow()
+        
+        version = await profile_repository.patch(
+            session.phone,
+            session.country_code,
+            changes,
+            expected_version=expected_version
+        )
+        session_cache.invalidate_phone(session.phone, session.country_code)
+        
+        if version is None:
+            if expected_version is not None:
+                raise HTTPException(
+                    status_code=412,
+                    detail="Le profil a été modifié sur un autre appareil, veuillez recharger"
+                )
+            raise HTTPException(status_code=404, detail="Profil non trouvé")
+        
+        # Contact cards only show the card fields
+        if set(changes) & set(PROFILE_VIEWS["card"]):
+            phone_directory.update(session.phone, session.country_code, changes)
+            await bump_contact_lists(existing_profile.id)
+        
+        return trusted_response(ProfilePatchResponse.model_construct(
+            success=True,
+            message="Profil mis à jour avec succès",
+            changes=changes,
+            version=version
+        ), headers={"ETag": profile_etag(existing_profile.id, version)})
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error patching profile: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la mise à jour du profil")
+
+# Avatar endpoints
+@api_router.get("/avatar/initials")
+async def get_initials_avatar(name: str = "", if_none_match: Optional[str] = Header(None)):
+    """
+    Generated SVG avatar for users without an uploaded one. Declared before
+    /avatar/{avatar_hash} so "initials" is not taken for a hash.
+    """
+    name = normalize_initials_name(name)
+    if len(name) > MAX_INITIALS_NAME_LENGTH:
+        raise HTTPException(status_code=400, detail="Nom trop long")
+    
+    svg = render_initials_svg(name)
+    etag = f'"{hashlib.sha256(svg).hexdigest()[:32]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Content-Security-Policy": "default-src 'none'"
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=svg, media_type="image/svg+xml", headers=headers)
+
+@api_router.get("/avatar/{avatar_hash}")
+async def get_avatar(avatar_hash: str, size: Optional[int] = None, if_none_match: Optional[str] = Header(None)):
+    """
+    Serve an avatar by content hash, optionally as a size x size thumbnail.
+    The content never changes, so it is cached forever.
+    """
+    if not AVATAR_HASH_PATTERN.match(avatar_hash):
+        raise HTTPException(status_code=404, detail="Image non trouvée")
+    if size is not None and size not in AVATAR_SIZES:
+        raise HTTPException(status_code=400, detail=f"Taille non supportée, tailles disponibles: {list(AVATAR_SIZES)}")
+    
+    key = variant_key(avatar_hash, size)
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        avatar = await avatar_store.get(key)
+        if not avatar and size is not None:
+            # Avatars stored before transcoding have no thumbnails
+            avatar = await avatar_store.get(avatar_hash)
+    except Exception as e:
+        logger.error(f"Error reading avatar: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la récupération de l'image")
+    
+    if not avatar:
+        raise HTTPException(status_code=404, detail="Image non trouvée")
+    
+    data, content_type = avatar
+    return Response(content=data, media_type=content_type, headers=headers)
+
 # Network endpoint
 @api_router.get("/network/{session_id}", response_model=NetworkResponse)
-async def get_user_network(session_id: str):
+async def get_user_network(auth: Tuple[UserSession, Optional[UserProfile]] = Depends(resolve_session)):
     """
     Get user's trust network members
     """
     try:
-        # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
-        
-        session = UserSession(**session_data)
+        session, _ = auth
         
         # Mock network data - In a real app, this would be calculated from tontine memberships
         mock_network_members = [
@@ -595,20 +1160,14 @@ class GroupFeedResponse(BaseModel):
 
 # Group Activity Feed endpoint
 @api_router.get("/v1/group/{group_id}/feed", response_model=GroupFeedResponse)
-async def get_group_activity_feed(group_id: str, session_id: str):
+async def get_group_activity_feed(
+    group_id: str,
+    auth: Tuple[UserSession, Optional[UserProfile]] = Depends(resolve_session)
+):
     """
     Get mixed activity feed for a group (user posts + system ledger events)
     """
     try:
-        # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
-        
         # Mock data for demonstration - In reality, this would fetch from database
         mock_ledger_events = [
             {
@@ -691,17 +1250,13 @@ async def get_group_activity_feed(group_id: str, session_id: str):
         all_items = mock_ledger_events + mock_user_posts
         all_items.sort(key=lambda x: x['timestamp'], reverse=True)
         
-        # Convert timestamps to ISO format for JSON serialization
-        for item in all_items:
-            item['timestamp'] = item['timestamp'].isoformat()
-        
         logger.info(f"Retrieved feed for group {group_id} with {len(all_items)} items")
         
-        return GroupFeedResponse(
+        return trusted_response(GroupFeedResponse.model_construct(
             success=True,
             message=f"Feed récupéré avec succès ({len(all_items)} éléments)",
-            items=all_items
-        )
+            items=[FeedItem.model_construct(**item) for item in all_items]
+        ))
         
     except HTTPException:
         raise
@@ -747,27 +1302,11 @@ async def get_stream_token(request: StreamTokenRequest):
     """
     try:
         # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": request.session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
-        
-        session = UserSession(**session_data)
-        
-        # Get user profile
-        profile_data = await db.user_profiles.find_one({
-            "phone": session.phone,
-            "country_code": session.country_code
-        })
+        session, profile = await resolve_session(request.session_id)
         
-        if not profile_data:
+        if not profile:
             raise HTTPException(status_code=404, detail="Profil utilisateur non trouvé")
         
-        profile = UserProfile(**profile_data)
-        
         # Generate unique user ID for Stream
         user_id = f"user_{profile.id}"
         username = f"{profile.first_name} {profile.last_name}"
@@ -810,26 +1349,10 @@ async def create_chat_channel(request: CreateChannelRequest):
     """
     try:
         # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": request.session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
+        session, profile = await resolve_session(request.session_id)
         
-        session = UserSession(**session_data)
-        
-        # Get user profile
-        profile_data = await db.user_profiles.find_one({
-            "phone": session.phone,
-            "country_code": session.country_code
-        })
-        
-        if not profile_data:
+        if not profile:
             raise HTTPException(status_code=404, detail="Profil utilisateur non trouvé")
-        
-        profile = UserProfile(**profile_data)
         user_id = f"user_{profile.id}"
         
         # Generate channel ID if not provided
@@ -864,19 +1387,17 @@ async def create_chat_channel(request: CreateChannelRequest):
             profile_id = member_id[5:]  # Remove "user_" prefix
             
             # Get the member's profile from our database
-            member_profile_data = await db.user_profiles.find_one({"id": profile_id})
+            member_profile = await profile_repository.by_id(profile_id, view="auth")
             
-            if not member_profile_data:
+            if not member_profile:
                 logger.warning(f"Member profile not found for ID: {profile_id}")
                 continue
-                
-            member_profile = UserProfile(**member_profile_data)
             
             # Create or update the user in Stream
             member_data = {
                 "id": member_id,
-                "name": f"{member_profile.first_name} {member_profile.last_name}",
-                "phone": f"{member_profile.country_code}{member_profile.phone}",
+                "name": f"{member_profile['first_name']} {member_profile['last_name']}",
+                "phone": f"{member_profile['country_code']}{member_profile['phone']}",
                 "role": "user"
             }
             
@@ -901,6 +1422,7 @@ async def create_chat_channel(request: CreateChannelRequest):
         }
         
         await db.chat_channels.insert_one(channel_metadata)
+        await collection_versions.bump(channels_key(member_id) for member_id in channel_data["members"])
         
         logger.info(f"Created chat channel {request.channel_id} for user {user_id}")
         
@@ -918,36 +1440,31 @@ async def create_chat_channel(request: CreateChannelRequest):
         raise HTTPException(status_code=500, detail="Erreur lors de la création du canal")
 
 @api_router.get("/chat/channels/{session_id}")
-async def get_user_channels(session_id: str):
+async def get_user_channels(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    auth: Tuple[UserSession, Optional[UserProfile]] = Depends(resolve_session)
+):
     """
-    Get all channels for a user
+    Get a user's channels, oldest first, one page at a time
     """
     try:
-        # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
-        
-        session = UserSession(**session_data)
-        
-        # Get user profile
-        profile_data = await db.user_profiles.find_one({
-            "phone": session.phone,
-            "country_code": session.country_code
-        })
+        session, profile = auth
         
-        if not profile_data:
+        if not profile:
             raise HTTPException(status_code=404, detail="Profil utilisateur non trouvé")
-        
-        profile = UserProfile(**profile_data)
+        check_page_size(limit)
         user_id = f"user_{profile.id}"
         
+        etag = page_etag(channels_key(user_id), await collection_versions.get(channels_key(user_id)), limit, cursor)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        
         # Get channels from our database
-        channels_data = await db.chat_channels.find({"members": user_id}).to_list(1000)
+        channels_data, next_cursor = await fetch_page(
+            db.chat_channels, {"members": user_id}, "created_at", limit, cursor
+        )
         
         # Convert MongoDB ObjectId to string to make it JSON serializable
         channels = []
@@ -957,11 +1474,12 @@ async def get_user_channels(session_id: str):
                 channel['_id'] = str(channel['_id'])
             channels.append(channel)
         
-        return {
+        return trusted_response({
             "success": True,
             "message": "Canaux récupérés avec succès",
-            "channels": channels
-        }
+            "channels": channels,
+            "next_cursor": next_cursor
+        }, headers=revalidation_headers(etag))
         
     except HTTPException:
         raise
@@ -980,6 +1498,38 @@ class UserSearchResponse(BaseModel):
     user_found: bool = False
     user_data: Optional[dict] = None
 
+class UserBatchRequest(BaseModel):
+    session_id: str
+    ids: List[str]  # Profile ids or Stream user ids ("user_<profile id>")
+
+class UserBatchResponse(BaseModel):
+    success: bool
+    message: str
+    users: List[dict] = []
+    not_found: List[str] = []
+
+class UserDiscoverRequest(BaseModel):
+    session_id: str
+    phones: List[str]  # Phonebook entries, in any format
+    country_code: Optional[str] = None  # For numbers without one; defaults to the user's own
+
+class UserDiscoverResponse(BaseModel):
+    success: bool
+    message: str
+    matches: List[dict] = []  # {"phone": phonebook entry, "user": user card}
+
+class HashedDiscoverRequest(BaseModel):
+    session_id: str
+    prefixes: List[str] = []  # Hash prefixes to list candidates for
+    hashes: List[str] = []  # Full hashes, confirmed by the client, to get the users of
+
+class HashedDiscoverResponse(BaseModel):
+    success: bool
+    message: str
+    prefix_length: int
+    candidates: Dict[str, List[str]] = {}  # prefix -> registered full hashes
+    matches: List[dict] = []  # {"hash": full hash, "user": user card}
+
 class AddContactRequest(BaseModel):
     session_id: str
     contact_phone: str
@@ -990,128 +1540,271 @@ class AddContactResponse(BaseModel):
     message: str
     contact_id: Optional[str] = None
 
+async def find_card_by_phone(phone: str, country_code: str) -> Optional[Dict[str, Any]]:
+    """
+    Card of the profile with this number, from the phone directory when it can tell
+    """
+    card = phone_directory.get(phone, country_code)
+    if card is None and not phone_directory.complete:
+        card = await profile_repository.by_phone(phone, country_code, view="card")
+        if card:
+            phone_directory.put(card)
+    return card
+
+def card_avatar_url(profile: Dict[str, Any]) -> str:
+    """
+    Thumbnail of the uploaded avatar, or the generated initials avatar
+    """
+    if profile.get("avatar_hash"):
+        return f"/api/avatar/{profile['avatar_hash']}?size=128"
+    name = f"{profile['first_name']} {profile['last_name']}"
+    return f"/api/avatar/initials?{urlencode({'name': name})}"
+
+def user_card(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Basic, non-sensitive user information from a card projection
+    """
+    return {
+        "id": profile["id"],
+        "user_id": f"user_{profile['id']}",
+        "first_name": profile["first_name"],
+        "last_name": profile["last_name"],
+        "phone": profile["phone"],
+        "country_code": profile["country_code"],
+        "city": profile.get("city"),
+        "country": profile.get("country"),
+        "avatar_url": card_avatar_url(profile)
+    }
+
 @api_router.post("/users/search", response_model=UserSearchResponse)
-async def search_user_by_phone(request: UserSearchRequest):
+async def search_user_by_phone(request: UserSearchRequest, http_request: Request):
     """
     Search for a user by phone number
     """
+    # Normalize phone number and country code
+    normalized_phone = normalize_phone(request.phone)
+    normalized_country_code = normalize_country_code(request.country_code)
+    
+    enforce_rate_limit(user_search_rate_limiter, http_request, f"{normalized_country_code}{normalized_phone}")
+    
     try:
-        # Normalize phone number and country code
-        normalized_phone = normalize_phone(request.phone)
-        normalized_country_code = normalize_country_code(request.country_code)
-        
         # Look for user profile by phone number
-        profile_data = await db.user_profiles.find_one({
-            "phone": normalized_phone,
-            "country_code": normalized_country_code
-        })
+        profile = await find_card_by_phone(normalized_phone, normalized_country_code)
         
-        if not profile_data:
+        if not profile:
             return UserSearchResponse(
                 success=True,
                 message="Utilisateur non trouvé",
                 user_found=False
             )
         
-        profile = UserProfile(**profile_data)
-        
-        # Return basic user information (not sensitive data)
-        user_data = {
-            "id": profile.id,
-            "user_id": f"user_{profile.id}",
-            "first_name": profile.first_name,
-            "last_name": profile.last_name,
-            "phone": profile.phone,
-            "country_code": profile.country_code,
-            "city": profile.city,
-            "country": profile.country,
-            "avatar_url": f"https://ui-avatars.com/api/?name={profile.first_name}+{profile.last_name}&background=random"
-        }
-        
         logger.info(f"User search successful for phone {normalized_phone}")
         
         return UserSearchResponse(
             success=True,
             message="Utilisateur trouvé",
             user_found=True,
-            user_data=user_data
+            user_data=user_card(profile)
         )
         
     except Exception as e:
         logger.error(f"Error searching user: {str(e)}")
         raise HTTPException(status_code=500, detail="Erreur lors de la recherche")
 
-@api_router.post("/users/add-contact", response_model=AddContactResponse)
-async def add_contact(request: AddContactRequest):
+@api_router.post("/users/batch", response_model=UserBatchResponse)
+async def get_users_batch(request: UserBatchRequest):
     """
-    Add a user as a contact
+    Get the cards of many users at once, in request order
     """
     try:
-        # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": request.session_id,
-            "is_verified": True
-        })
+        await resolve_session(request.session_id)
         
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
+        if len(request.ids) > MAX_BATCH_PROFILE_IDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Trop d'identifiants, maximum {MAX_BATCH_PROFILE_IDS} par requête"
+            )
         
-        session = UserSession(**session_data)
+        # Accept Stream user ids too and collapse duplicates, keeping the first position
+        profile_ids = list(dict.fromkeys(
+            user_id[5:] if user_id.startswith("user_") else user_id
+            for user_id in request.ids
+        ))
         
-        # Get current user profile
-        current_profile_data = await db.user_profiles.find_one({
-            "phone": session.phone,
-            "country_code": session.country_code
-        })
+        profiles = {
+            profile["id"]: profile
+            for profile in await profile_repository.by_ids(profile_ids, view="card")
+        }
         
-        if not current_profile_data:
+        return trusted_response(UserBatchResponse.model_construct(
+            success=True,
+            message=f"{len(profiles)} utilisateurs trouvés",
+            users=[user_card(profiles[profile_id]) for profile_id in profile_ids if profile_id in profiles],
+            not_found=[profile_id for profile_id in profile_ids if profile_id not in profiles]
+        ))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting users batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la récupération des utilisateurs")
+
+@api_router.post("/users/discover", response_model=UserDiscoverResponse)
+async def discover_users(request: UserDiscoverRequest, http_request: Request):
+    """
+    Find which numbers of a phonebook belong to registered users, in one request
+    """
+    try:
+        session, profile = await resolve_session(request.session_id)
+        if not profile:
             raise HTTPException(status_code=404, detail="Profil utilisateur non trouvé")
         
-        current_profile = UserProfile(**current_profile_data)
+        enforce_rate_limit(user_discover_rate_limiter, http_request, f"{session.country_code}{session.phone}")
+        
+        if len(request.phones) > MAX_DISCOVER_PHONES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Trop de numéros, maximum {MAX_DISCOVER_PHONES} par requête"
+            )
+        
+        default_country_code = normalize_country_code(request.country_code or profile.country_code)
+        
+        # Normalize every entry once; the first entry wins when several give the same key
+        entries_by_key = {}
+        for phone in request.phones:
+            for key in phonebook_keys(phone, default_country_code):
+                entries_by_key.setdefault(key, phone)
+        
+        matches = [
+            {"phone": entries_by_key[match["phone_key"]], "user": user_card(match)}
+            for match in await profile_repository.by_phone_keys(entries_by_key, view="card")
+            if match["id"] != profile.id
+        ]
+        
+        return trusted_response(UserDiscoverResponse.model_construct(
+            success=True,
+            message=f"{len(matches)} utilisateurs trouvés",
+            matches=matches
+        ))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error discovering users: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la recherche des contacts")
+
+@api_router.post("/users/discover/hashed", response_model=HashedDiscoverResponse)
+async def discover_users_hashed(request: HashedDiscoverRequest, http_request: Request):
+    """
+    Contact discovery without sending numbers: list the registered hashes
+    under the client's hash prefixes, and the users of the full hashes it
+    confirmed. Answered from the in-memory phone hash index.
+    """
+    try:
+        session, profile = await resolve_session(request.session_id)
+        if not profile:
+            raise HTTPException(status_code=404, detail="Profil utilisateur non trouvé")
+        
+        enforce_rate_limit(user_discover_rate_limiter, http_request, f"{session.country_code}{session.phone}")
+        
+        if len(request.prefixes) + len(request.hashes) > MAX_DISCOVER_PHONES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Trop de numéros, maximum {MAX_DISCOVER_PHONES} par requête"
+            )
+        prefix_length = phone_hash_index.prefix_length
+        if any(len(prefix) != prefix_length or not HEX_DIGEST.fullmatch(prefix) for prefix in request.prefixes):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Les préfixes doivent compter {prefix_length} caractères hexadécimaux minuscules"
+            )
+        if any(len(full_hash) != 64 or not HEX_DIGEST.fullmatch(full_hash) for full_hash in request.hashes):
+            raise HTTPException(status_code=400, detail="Empreinte SHA-256 invalide")
+        
+        if not phone_hash_index.ready:
+            raise HTTPException(
+                status_code=503,
+                detail="Index en cours de chargement, veuillez réessayer",
+                headers={"Retry-After": "5"}
+            )
+        
+        candidates = phone_hash_index.candidates(request.prefixes)
+        profile_ids = phone_hash_index.profile_ids(request.hashes)
+        profiles = {
+            card["id"]: card
+            for card in await profile_repository.by_ids(set(profile_ids.values()), view="card")
+        }
+        matches = [
+            {"hash": full_hash, "user": user_card(profiles[profile_id])}
+            for full_hash, profile_id in profile_ids.items()
+            if profile_id in profiles and profile_id != profile.id
+        ]
+        
+        return trusted_response(HashedDiscoverResponse.model_construct(
+            success=True,
+            message=f"{len(matches)} utilisateurs trouvés",
+            prefix_length=prefix_length,
+            candidates=candidates,
+            matches=matches
+        ))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error discovering users by hash: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la recherche des contacts")
+
+@api_router.post("/users/add-contact", response_model=AddContactResponse)
+async def add_contact(request: AddContactRequest):
+    """
+    Add a user as a contact
+    """
+    try:
+        # Verify session
+        session, current_profile = await resolve_session(request.session_id)
+        
+        if not current_profile:
+            raise HTTPException(status_code=404, detail="Profil utilisateur non trouvé")
         
         # Check if contact exists
-        contact_profile_data = await db.user_profiles.find_one({
-            "phone": request.contact_phone,
-            "country_code": request.contact_country_code
-        })
+        contact_profile = await find_card_by_phone(request.contact_phone, request.contact_country_code)
         
-        if not contact_profile_data:
+        if not contact_profile:
             raise HTTPException(status_code=404, detail="Contact non trouvé")
         
-        contact_profile = UserProfile(**contact_profile_data)
-        
         # Check if contact is already added
         existing_contact = await db.user_contacts.find_one({
             "user_id": current_profile.id,
-            "contact_id": contact_profile.id
+            "contact_id": contact_profile["id"]
         })
         
         if existing_contact:
             return AddContactResponse(
                 success=True,
                 message="Contact déjà ajouté",
-                contact_id=contact_profile.id
+                contact_id=contact_profile["id"]
             )
         
         # Add contact
         contact_data = {
             "id": str(uuid.uuid4()),
             "user_id": current_profile.id,
-            "contact_id": contact_profile.id,
-            "contact_name": f"{contact_profile.first_name} {contact_profile.last_name}",
-            "contact_phone": contact_profile.phone,
-            "contact_country_code": contact_profile.country_code,
+            "contact_id": contact_profile["id"],
+            "contact_name": f"{contact_profile['first_name']} {contact_profile['last_name']}",
+            "contact_phone": contact_profile["phone"],
+            "contact_country_code": contact_profile["country_code"],
             "added_at": datetime.utcnow()
         }
         
         await db.user_contacts.insert_one(contact_data)
+        await collection_versions.bump([contacts_key(current_profile.id)])
         
-        logger.info(f"Contact added: {current_profile.id} -> {contact_profile.id}")
+        logger.info(f"Contact added: {current_profile.id} -> {contact_profile['id']}")
         
         return AddContactResponse(
             success=True,
             message="Contact ajouté avec succès",
-            contact_id=contact_profile.id
+            contact_id=contact_profile["id"]
         )
         
     except HTTPException:
@@ -1121,63 +1814,64 @@ async def add_contact(request: AddContactRequest):
         raise HTTPException(status_code=500, detail="Erreur lors de l'ajout du contact")
 
 @api_router.get("/users/contacts/{session_id}")
-async def get_user_contacts(session_id: str):
+async def get_user_contacts(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    auth: Tuple[UserSession, Optional[UserProfile]] = Depends(resolve_session)
+):
     """
-    Get all contacts for a user
+    Get a user's contacts, oldest first, one page at a time
     """
     try:
-        # Verify session
-        session_data = await db.user_sessions.find_one({
-            "id": session_id,
-            "is_verified": True
-        })
-        
-        if not session_data:
-            raise HTTPException(status_code=401, detail="Session invalide")
-        
-        session = UserSession(**session_data)
+        session, profile = auth
         
-        # Get user profile
-        profile_data = await db.user_profiles.find_one({
-            "phone": session.phone,
-            "country_code": session.country_code
-        })
-        
-        if not profile_data:
+        if not profile:
             raise HTTPException(status_code=404, detail="Profil utilisateur non trouvé")
+        check_page_size(limit)
         
-        profile = UserProfile(**profile_data)
+        etag = page_etag(contacts_key(profile.id), await collection_versions.get(contacts_key(profile.id)), limit, cursor)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
         
         # Get contacts from database
-        contacts_data = await db.user_contacts.find({"user_id": profile.id}).to_list(1000)
+        contacts_data, next_cursor = await fetch_page(
+            db.user_contacts, {"user_id": profile.id}, "added_at", limit, cursor,
+            projection={"_id": 0, "contact_id": 1, "added_at": 1}
+        )
         
-        # Enrich contacts with profile data
+        # Enrich contacts with profile data, fetched in one $in query
+        contact_profiles = {
+            contact_profile["id"]: contact_profile
+            for contact_profile in await profile_repository.by_ids(
+                {contact["contact_id"] for contact in contacts_data}, view="card"
+            )
+        }
         contacts = []
         for contact in contacts_data:
-            # Get contact profile
-            contact_profile_data = await db.user_profiles.find_one({"id": contact["contact_id"]})
-            if contact_profile_data:
-                contact_profile = UserProfile(**contact_profile_data)
+            contact_profile = contact_profiles.get(contact["contact_id"])
+            if contact_profile:
                 enriched_contact = {
                     "id": contact["contact_id"],
                     "user_id": f"user_{contact['contact_id']}",
-                    "name": f"{contact_profile.first_name} {contact_profile.last_name}",
-                    "first_name": contact_profile.first_name,
-                    "last_name": contact_profile.last_name,
-                    "phone": contact_profile.phone,
-                    "country_code": contact_profile.country_code,
-                    "city": contact_profile.city,
-                    "country": contact_profile.country,
-                    "avatar_url": f"https://ui-avatars.com/api/?name={contact_profile.first_name}+{contact_profile.last_name}&background=random",
+                    "name": f"{contact_profile['first_name']} {contact_profile['last_name']}",
+                    "first_name": contact_profile["first_name"],
+                    "last_name": contact_profile["last_name"],
+                    "phone": contact_profile["phone"],
+                    "country_code": contact_profile["country_code"],
+                    "city": contact_profile.get("city"),
+                    "country": contact_profile.get("country"),
+                    "avatar_url": card_avatar_url(contact_profile),
                     "added_at": contact["added_at"]
                 }
                 contacts.append(enriched_contact)
         
-        return {
+        return trusted_response({
             "success": True,
             "message": "Contacts récupérés avec succès",
-            "contacts": contacts
-        }
+            "contacts": contacts,
+            "next_cursor": next_cursor
+        }, headers=revalidation_headers(etag))
         
     except HTTPException:
         raise
@@ -1185,6 +1879,48 @@ async def get_user_contacts(session_id: str):
         logger.error(f"Error getting user contacts: {str(e)}")
         raise HTTPException(status_code=500, detail="Erreur lors de la récupération des contacts")
 
+# Monitoring
+@api_router.get("/monitoring/rate-limits")
+async def get_rate_limit_stats():
+    """
+    Rate limiter counters per endpoint and scope
+    """
+    return {
+        "send_code": send_code_rate_limiter.stats(),
+        "user_search": user_search_rate_limiter.stats(),
+        "user_discover": user_discover_rate_limiter.stats()
+    }
+
+@api_router.get("/monitoring/sessions")
+async def get_session_stats():
+    """
+    Session cache, activity flusher, janitor and change stream counters
+    """
+    return {
+        "cache": session_cache.stats(),
+        "activity_flushed": session_activity.flushed,
+        "janitor": session_janitor.stats(),
+        "change_stream": change_watcher.stats()
+    }
+
+@api_router.get("/monitoring/discovery")
+async def get_discovery_stats():
+    """
+    Phone hash index and phone directory counters
+    """
+    return {
+        "loader": profile_indexes.stats(),
+        "hash_index": phone_hash_index.stats(),
+        "directory": phone_directory.stats()
+    }
+
+@api_router.get("/monitoring/sms")
+async def get_sms_stats():
+    """
+    SMS dispatch queue counters
+    """
+    return sms_dispatcher.stats()
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -1194,6 +1930,8 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paging cursors and cache validators are sent as headers
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Configure logging
@@ -1203,6 +1941,74 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    report = await ensure_indexes(db)
+    logger.info(
+        f"Index bootstrap: created={report['created']} "
+        f"existing={len(report['existing'])} failed={report['failed']}"
+    )
+    try:
+        backfilled = await profile_repository.backfill_versions()
+        if backfilled:
+            logger.info(f"Backfilled version on {backfilled} profiles")
+    except Exception as e:
+        logger.error(f"Error backfilling profile versions: {str(e)}")
+    try:
+        backfilled = await profile_repository.backfill_phone_keys()
+        if backfilled:
+            logger.info(f"Backfilled phone_key on {backfilled} profiles")
+    except Exception as e:
+        logger.error(f"Error backfilling profile phone keys: {str(e)}")
+
+@app.on_event("startup")
+async def start_profile_indexes():
+    schedule_profile_index_load()
+    background_tasks.append(asyncio.create_task(profile_indexes.run()))
+
+@app.on_event("startup")
+async def start_avatar_migration():
+    async def migrate():
+        try:
+            migrated = await migrate_inline_avatars(db, avatar_store, avatar_processor.transcode)
+            if migrated:
+                logger.info(f"Moved {migrated} inline avatars to the avatar store")
+        except Exception as e:
+            logger.error(f"Error migrating inline avatars: {str(e)}")
+    
+    background_tasks.append(asyncio.create_task(migrate()))
+
+@app.on_event("startup")
+async def start_session_activity_flusher():
+    background_tasks.append(asyncio.create_task(session_activity.run()))
+
+@app.on_event("startup")
+async def start_session_janitor():
+    background_tasks.append(asyncio.create_task(session_janitor.run()))
+
+@app.on_event("startup")
+async def start_change_watcher():
+    if CHANGE_STREAMS_ENABLED:
+        background_tasks.append(asyncio.create_task(change_watcher.run()))
+
+@app.on_event("startup")
+async def start_sms_dispatcher():
+    background_tasks.append(asyncio.create_task(sms_dispatcher.run()))
+
+@app.on_event("startup")
+async def start_session_token_revocation_refresh():
+    if session_token_codec:
+        background_tasks.append(asyncio.create_task(revocation_list.run()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    try:
+        await session_activity.flush()
+    except Exception as e:
+        logger.error(f"Error flushing session activity on shutdown: {str(e)}")
+    await session_store.close()
+    avatar_processor.close()
     client.close()
@@ -0,0 +1,55 @@
+"""
+Coalesced last-seen tracking for sliding session expiry.
+
+Authenticated requests only record the time they saw a session in memory;
+a background flusher persists all pending timestamps in one bulk write every
+few seconds, pushing each session's expires_at forward.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LastSeenTracker:
+    def __init__(self, store, lifetime: timedelta, flush_interval: float = 5.0):
+        self.store = store
+        self.lifetime = lifetime
+        self.flush_interval = flush_interval
+        # session id -> last time it was seen, not yet persisted
+        self._pending: Dict[str, datetime] = {}
+        self.flushed = 0
+
+    def touch(self, session_id: str, seen_at: Optional[datetime] = None) -> None:
+        self._pending[session_id] = seen_at or datetime.utcnow()
+
+    async def flush(self) -> int:
+        """
+        Persist pending timestamps; returns how many sessions were renewed
+        """
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        try:
+            await self.store.renew_many(pending, self.lifetime)
+        except Exception:
+            # Keep the timestamps for the next flush unless newer ones arrived
+            for session_id, seen_at in pending.items():
+                self._pending.setdefault(session_id, seen_at)
+            raise
+
+        self.flushed += len(pending)
+        return len(pending)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing session activity: {str(e)}")
@@ -0,0 +1,92 @@
+"""
+In-process cache of resolved sessions (session_id -> (UserSession, UserProfile)).
+
+Entries expire after a fixed TTL and the least recently used entry is evicted
+once the cache is full. Writers must call the invalidate_* helpers whenever
+the underlying session or profile documents change.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+class SessionCache:
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 60.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # session_id -> (expires_at, session, profile)
+        self._entries: "OrderedDict[str, Tuple[float, Any, Any]]" = OrderedDict()
+        # (phone, country_code) -> session ids, used for profile invalidation
+        self._by_phone: Dict[Tuple[str, str], Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, session_id: str) -> Optional[Tuple[Any, Any]]:
+        """
+        Return the cached (session, profile) pair or None on a miss
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, session, profile = entry
+        if self._clock() >= expires_at:
+            self._remove(session_id)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return session, profile
+
+    def put(self, session_id: str, session: Any, profile: Any) -> None:
+        if session_id in self._entries:
+            self._remove(session_id)
+
+        self._entries[session_id] = (self._clock() + self.ttl_seconds, session, profile)
+        self._by_phone.setdefault((session.phone, session.country_code), set()).add(session_id)
+
+        while len(self._entries) > self.max_entries:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.evictions += 1
+
+    def invalidate(self, session_id: str) -> None:
+        self._remove(session_id)
+
+    def invalidate_phone(self, phone: str, country_code: str) -> None:
+        """
+        Drop every cached session belonging to a phone number, e.g. after its profile changed
+        """
+        for session_id in list(self._by_phone.get((phone, country_code), ())):
+            self._remove(session_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_phone.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return
+        session = entry[1]
+        key = (session.phone, session.country_code)
+        session_ids = self._by_phone.get(key)
+        if session_ids is not None:
+            session_ids.discard(session_id)
+            if not session_ids:
+                del self._by_phone[key]
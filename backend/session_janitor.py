@@ -0,0 +1,74 @@
+"""
+Background cleanup of expired and abandoned sessions.
+
+Each sweep deletes expired sessions in bounded batches (yielding to the event
+loop between batches) so request handlers never have to clean up after
+themselves.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SessionJanitor:
+    def __init__(self, store, interval: float = 300.0, batch_size: int = 1000, max_batches: int = 100):
+        self.store = store
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.runs = 0
+        self.total_deleted = 0
+        self.last_run: Dict = {}
+
+    async def sweep(self) -> Dict:
+        """
+        Delete expired sessions batch by batch, up to max_batches per sweep
+        """
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        deleted = 0
+        batches = 0
+
+        while batches < self.max_batches:
+            count = await self.store.purge_expired(now, self.batch_size)
+            batches += 1
+            deleted += count
+            if count < self.batch_size:
+                break
+            await asyncio.sleep(0)
+
+        self.runs += 1
+        self.total_deleted += deleted
+        self.last_run = {
+            "finished_at": datetime.utcnow().isoformat(),
+            "deleted": deleted,
+            "batches": batches,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        if deleted:
+            logger.info(
+                f"Session janitor deleted {deleted} sessions in {batches} batches "
+                f"({self.last_run['duration_ms']} ms)"
+            )
+        return self.last_run
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error running session janitor: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict:
+        return {
+            "runs": self.runs,
+            "total_deleted": self.total_deleted,
+            "last_run": self.last_run,
+        }
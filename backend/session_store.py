@@ -0,0 +1,350 @@
+"""
+Storage backends for authentication sessions.
+
+Sessions are plain dicts with the UserSession fields (id, phone, country_code,
+verification_code, is_verified, created_at, expires_at). Each backend keeps at
+most one pending (unverified) session per phone and performs every auth step
+as a single atomic operation.
+
+    mongo   - the user_sessions collection (default)
+    memory  - process-local dicts, for single-node deployments and tests
+    redis   - any Redis-protocol server, sessions expire with key TTLs
+"""
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+
+class SessionStore:
+    async def issue_code(self, session: Dict) -> str:
+        """
+        Create or refresh the pending session of session["phone"].
+        Returns the id of the stored session, which may predate `session`.
+        """
+        raise NotImplementedError
+
+    async def verify(self, phone: str, country_code: str, now: datetime, expires_at: datetime) -> Optional[Dict]:
+        """
+        Mark the pending, unexpired session of a phone as verified until `expires_at`
+        """
+        raise NotImplementedError
+
+    async def has_pending(self, phone: str, country_code: str) -> bool:
+        raise NotImplementedError
+
+    async def get_verified(self, session_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    async def renew_many(self, last_seen: Dict[str, datetime], lifetime: timedelta) -> None:
+        """
+        Record last activity and push expires_at to last_seen + lifetime for many verified sessions
+        """
+        raise NotImplementedError
+
+    async def purge_expired(self, now: datetime, limit: int) -> int:
+        """
+        Delete up to `limit` sessions whose expires_at has passed (verified or abandoned)
+        and return how many were deleted
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MongoSessionStore(SessionStore):
+    def __init__(self, db):
+        self.collection = db.user_sessions
+
+    async def issue_code(self, session: Dict) -> str:
+        # The unique partial index on unverified sessions makes concurrent
+        # upserts converge on a single document
+        for attempt in range(2):
+            try:
+                session_data = await self.collection.find_one_and_update(
+                    {
+                        "phone": session["phone"],
+                        "country_code": session["country_code"],
+                        "is_verified": False
+                    },
+                    {
+                        "$set": {
+                            "verification_code": session["verification_code"],
+                            "created_at": session["created_at"],
+                            "expires_at": session["expires_at"]
+                        },
+                        # _id doubles as the session id so delete events in change streams carry it
+                        "$setOnInsert": {"_id": session["id"], "id": session["id"]}
+                    },
+                    projection={"_id": 0, "id": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                return session_data["id"]
+            except DuplicateKeyError:
+                # Lost an upsert race, the retry updates the winner's document
+                if attempt:
+                    raise
+
+    async def verify(self, phone: str, country_code: str, now: datetime, expires_at: datetime) -> Optional[Dict]:
+        return await self.collection.find_one_and_update(
+            {
+                "phone": phone,
+                "country_code": country_code,
+                "is_verified": False,
+                "expires_at": {"$gt": now}
+            },
+            {"$set": {"is_verified": True, "expires_at": expires_at}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def has_pending(self, phone: str, country_code: str) -> bool:
+        pending = await self.collection.find_one(
+            {"phone": phone, "country_code": country_code, "is_verified": False},
+            {"_id": 0, "id": 1}
+        )
+        return pending is not None
+
+    async def get_verified(self, session_id: str) -> Optional[Dict]:
+        return await self.collection.find_one({"id": session_id, "is_verified": True})
+
+    async def delete(self, session_id: str) -> None:
+        await self.collection.delete_one({"id": session_id})
+
+    async def renew_many(self, last_seen: Dict[str, datetime], lifetime: timedelta) -> None:
+        if not last_seen:
+            return
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"id": session_id, "is_verified": True},
+                {"$set": {"last_seen_at": seen_at, "expires_at": seen_at + lifetime}}
+            )
+            for session_id, seen_at in last_seen.items()
+        ], ordered=False)
+
+    async def purge_expired(self, now: datetime, limit: int) -> int:
+        expired = self.collection.find({"expires_at": {"$lte": now}}, {"_id": 0, "id": 1}).limit(limit)
+        session_ids = [session["id"] async for session in expired]
+        if not session_ids:
+            return 0
+        # Re-check expiry so sessions renewed in the meantime survive
+        result = await self.collection.delete_many({
+            "id": {"$in": session_ids},
+            "expires_at": {"$lte": now}
+        })
+        return result.deleted_count
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self):
+        self._sessions: Dict[str, Dict] = {}
+        # (phone, country_code) -> id of the pending session
+        self._pending: Dict[Tuple[str, str], str] = {}
+
+    async def issue_code(self, session: Dict) -> str:
+        key = (session["phone"], session["country_code"])
+        pending = self._sessions.get(self._pending.get(key))
+        if pending is not None:
+            pending.update(
+                verification_code=session["verification_code"],
+                created_at=session["created_at"],
+                expires_at=session["expires_at"]
+            )
+            return pending["id"]
+
+        self._sessions[session["id"]] = dict(session, is_verified=False)
+        self._pending[key] = session["id"]
+        return session["id"]
+
+    async def verify(self, phone: str, country_code: str, now: datetime, expires_at: datetime) -> Optional[Dict]:
+        session = self._sessions.get(self._pending.get((phone, country_code)))
+        if session is None or session["expires_at"] <= now:
+            return None
+
+        del self._pending[(phone, country_code)]
+        session.update(is_verified=True, expires_at=expires_at)
+        return dict(session)
+
+    async def has_pending(self, phone: str, country_code: str) -> bool:
+        return (phone, country_code) in self._pending
+
+    async def get_verified(self, session_id: str) -> Optional[Dict]:
+        session = self._sessions.get(session_id)
+        if session is None or not session["is_verified"] or session["expires_at"] <= datetime.utcnow():
+            return None
+        return dict(session)
+
+    async def delete(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is not None and not session["is_verified"]:
+            self._pending.pop((session["phone"], session["country_code"]), None)
+
+    async def renew_many(self, last_seen: Dict[str, datetime], lifetime: timedelta) -> None:
+        for session_id, seen_at in last_seen.items():
+            session = self._sessions.get(session_id)
+            if session is not None and session["is_verified"]:
+                session.update(last_seen_at=seen_at, expires_at=seen_at + lifetime)
+
+    async def purge_expired(self, now: datetime, limit: int) -> int:
+        expired = list(islice(
+            (session_id for session_id, session in self._sessions.items() if session["expires_at"] <= now),
+            limit
+        ))
+        for session_id in expired:
+            await self.delete(session_id)
+        return len(expired)
+
+
+# KEYS: pending key; ARGV: new id, code, created_at ms, expires_at ms, phone, country_code
+_ISSUE_CODE_SCRIPT = """
+local session_id = redis.call('GET', KEYS[1])
+if not session_id or redis.call('EXISTS', 'session:' .. session_id) == 0 then
+    session_id = ARGV[1]
+end
+local session_key = 'session:' .. session_id
+redis.call('HSET', session_key,
+    'id', session_id, 'phone', ARGV[5], 'country_code', ARGV[6],
+    'verification_code', ARGV[2], 'is_verified', '0',
+    'created_at', ARGV[3], 'expires_at', ARGV[4])
+redis.call('PEXPIREAT', session_key, ARGV[4])
+redis.call('SET', KEYS[1], session_id, 'PXAT', ARGV[4])
+return session_id
+"""
+
+# KEYS: pending key; ARGV: now ms, new expires_at ms
+_VERIFY_SCRIPT = """
+local session_id = redis.call('GET', KEYS[1])
+if not session_id then
+    return nil
+end
+local session_key = 'session:' .. session_id
+local expires_at = redis.call('HGET', session_key, 'expires_at')
+if not expires_at or tonumber(expires_at) <= tonumber(ARGV[1]) then
+    return nil
+end
+redis.call('HSET', session_key, 'is_verified', '1', 'expires_at', ARGV[2])
+redis.call('PEXPIREAT', session_key, ARGV[2])
+redis.call('DEL', KEYS[1])
+return redis.call('HGETALL', session_key)
+"""
+
+# KEYS: session key; ARGV: session id
+_DELETE_SCRIPT = """
+local fields = redis.call('HMGET', KEYS[1], 'phone', 'country_code')
+if fields[1] and fields[2] then
+    local pending_key = 'pending:' .. fields[2] .. fields[1]
+    if redis.call('GET', pending_key) == ARGV[1] then
+        redis.call('DEL', pending_key)
+    end
+end
+return redis.call('DEL', KEYS[1])
+"""
+
+
+def _to_millis(value: datetime) -> int:
+    return int((value - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def _from_millis(value) -> datetime:
+    return datetime.utcfromtimestamp(int(value) / 1000)
+
+
+class RedisSessionStore(SessionStore):
+    def __init__(self, url: str):
+        # Imported lazily so the redis client is only needed when this backend is selected
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url, decode_responses=True)
+        self._issue_code = self.redis.register_script(_ISSUE_CODE_SCRIPT)
+        self._verify = self.redis.register_script(_VERIFY_SCRIPT)
+        self._delete = self.redis.register_script(_DELETE_SCRIPT)
+
+    @staticmethod
+    def _pending_key(phone: str, country_code: str) -> str:
+        return f"pending:{country_code}{phone}"
+
+    @staticmethod
+    def _decode(fields: Dict[str, str]) -> Dict:
+        return {
+            "id": fields["id"],
+            "phone": fields["phone"],
+            "country_code": fields["country_code"],
+            "verification_code": fields["verification_code"],
+            "is_verified": fields["is_verified"] == "1",
+            "created_at": _from_millis(fields["created_at"]),
+            "expires_at": _from_millis(fields["expires_at"]),
+        }
+
+    async def issue_code(self, session: Dict) -> str:
+        return await self._issue_code(
+            keys=[self._pending_key(session["phone"], session["country_code"])],
+            args=[
+                session["id"],
+                session["verification_code"],
+                _to_millis(session["created_at"]),
+                _to_millis(session["expires_at"]),
+                session["phone"],
+                session["country_code"],
+            ]
+        )
+
+    async def verify(self, phone: str, country_code: str, now: datetime, expires_at: datetime) -> Optional[Dict]:
+        fields = await self._verify(
+            keys=[self._pending_key(phone, country_code)],
+            args=[_to_millis(now), _to_millis(expires_at)]
+        )
+        if not fields:
+            return None
+        return self._decode(dict(zip(fields[::2], fields[1::2])))
+
+    async def has_pending(self, phone: str, country_code: str) -> bool:
+        return bool(await self.redis.exists(self._pending_key(phone, country_code)))
+
+    async def get_verified(self, session_id: str) -> Optional[Dict]:
+        fields = await self.redis.hgetall(f"session:{session_id}")
+        if not fields or fields.get("is_verified") != "1":
+            return None
+        return self._decode(fields)
+
+    async def delete(self, session_id: str) -> None:
+        # A pending session also drops the phone's pointer to it
+        await self._delete(keys=[f"session:{session_id}"], args=[session_id])
+
+    async def renew_many(self, last_seen: Dict[str, datetime], lifetime: timedelta) -> None:
+        if not last_seen:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for session_id, seen_at in last_seen.items():
+                pipe.pexpireat(f"session:{session_id}", _to_millis(seen_at + lifetime))
+            results = await pipe.execute()
+            # Only sessions that still exist get their fields updated
+            for (session_id, seen_at), renewed in zip(last_seen.items(), results):
+                if renewed:
+                    pipe.hset(f"session:{session_id}", mapping={
+                        "last_seen_at": _to_millis(seen_at),
+                        "expires_at": _to_millis(seen_at + lifetime)
+                    })
+            await pipe.execute()
+
+    async def purge_expired(self, now: datetime, limit: int) -> int:
+        # Session keys carry their own TTL, Redis expires them itself
+        return 0
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def create_session_store(backend: str, db=None, redis_url: Optional[str] = None) -> SessionStore:
+    if backend == "mongo":
+        return MongoSessionStore(db)
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "redis":
+        return RedisSessionStore(redis_url)
+    raise ValueError(f"Unknown session store backend: {backend}")
@@ -0,0 +1,95 @@
+"""
+Stateless signed session tokens.
+
+When SESSION_TOKEN_MODE=jwt, verify_code hands out an HS256 token instead of
+the raw session id. Authenticated routes validate it locally; the only shared
+state is a small revocation list (revoked session ids until their expiry)
+mirrored in memory and refreshed from the revoked_sessions collection.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+
+def looks_like_token(value: str) -> bool:
+    """Session ids are UUIDs, tokens are three dot-separated segments"""
+    return value.count('.') == 2
+
+
+class SessionTokenCodec:
+    def __init__(self, secret: str, algorithm: str = "HS256"):
+        self.secret = secret
+        self.algorithm = algorithm
+
+    def issue(self, session_id: str, phone: str, country_code: str, profile_id: Optional[str],
+              issued_at: datetime, expires_at: datetime) -> str:
+        claims = {
+            "sid": session_id,
+            "phone": phone,
+            "cc": country_code,
+            "iat": issued_at,
+            "exp": expires_at,
+        }
+        if profile_id:
+            claims["pid"] = profile_id
+        return jwt.encode(claims, self.secret, algorithm=self.algorithm)
+
+    def decode(self, token: str) -> Optional[Dict]:
+        """
+        Return the token claims, or None if the signature is invalid or the token expired
+        """
+        try:
+            return jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except jwt.PyJWTError:
+            return None
+
+
+class RevocationList:
+    def __init__(self, db, refresh_interval: float = 30.0):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        # session id -> expiry of the revoked token
+        self._revoked: Dict[str, datetime] = {}
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def is_revoked(self, session_id: str) -> bool:
+        return session_id in self._revoked
+
+    async def revoke(self, session_id: str, expires_at: datetime) -> None:
+        self._revoked[session_id] = expires_at
+        await self.db.revoked_sessions.update_one(
+            {"session_id": session_id},
+            {"$set": {"session_id": session_id, "expires_at": expires_at}},
+            upsert=True
+        )
+
+    async def refresh(self) -> None:
+        """
+        Replace the local set with the unexpired revocations stored in Mongo
+        """
+        now = datetime.utcnow()
+        cursor = self.db.revoked_sessions.find(
+            {"expires_at": {"$gt": now}},
+            {"_id": 0, "session_id": 1, "expires_at": 1}
+        )
+        revoked = {}
+        async for doc in cursor:
+            revoked[doc["session_id"]] = doc["expires_at"]
+        self._revoked = revoked
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing revocation list: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
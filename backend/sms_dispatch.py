@@ -0,0 +1,139 @@
+"""
+Asynchronous outbound SMS dispatch.
+
+send_verification_code only enqueues a message; a worker drains the bounded
+queue in batches, sends them through the gateway under a per-provider
+concurrency limit and retries failures with exponential backoff, so SMS
+latency never shows up in the request path.
+"""
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SmsMessage:
+    phone: str
+    body: str
+    attempts: int = 0
+
+
+class SmsGateway:
+    name = "gateway"
+
+    async def send_batch(self, messages: List[SmsMessage]) -> List[bool]:
+        """
+        Send messages and return, for each one, whether it was accepted
+        """
+        raise NotImplementedError
+
+
+class MockSmsGateway(SmsGateway):
+    """
+    Local stand-in for a real provider: logs messages instead of sending them
+    """
+    name = "mock"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent: List[SmsMessage] = []
+
+    async def send_batch(self, messages: List[SmsMessage]) -> List[bool]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for message in messages:
+            logger.info(f"[mock SMS] to {message.phone}: {message.body}")
+        self.sent.extend(messages)
+        return [True] * len(messages)
+
+
+class SmsDispatcher:
+    def __init__(self, gateway: SmsGateway, queue_size: int = 10000, batch_size: int = 50,
+                 max_concurrency: int = 4, max_attempts: int = 5, base_backoff: float = 0.5):
+        self.gateway = gateway
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self._queue: "asyncio.Queue[SmsMessage]" = asyncio.Queue(maxsize=queue_size)
+        self._provider_slots = asyncio.Semaphore(max_concurrency)
+        self._in_flight = set()
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def enqueue(self, phone: str, body: str) -> bool:
+        """
+        Queue a message without waiting; returns False if the queue is full
+        """
+        try:
+            self._queue.put_nowait(SmsMessage(phone=phone, body=body))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error(f"SMS queue full, dropping message to {phone}")
+            return False
+
+    async def run(self) -> None:
+        """
+        Worker loop: take whatever is queued (up to batch_size) and send it as one batch
+        """
+        try:
+            while True:
+                # Wait for a free provider slot first so batches stay in the bounded queue
+                await self._provider_slots.acquire()
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                task = asyncio.create_task(self._send(batch))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+        finally:
+            for task in list(self._in_flight):
+                task.cancel()
+
+    async def _send(self, batch: List[SmsMessage]) -> None:
+        try:
+            results = await self.gateway.send_batch(batch)
+        except Exception as e:
+            logger.error(f"SMS gateway {self.gateway.name} failed: {str(e)}")
+            results = [False] * len(batch)
+        finally:
+            self._provider_slots.release()
+
+        retries = []
+        for message, accepted in zip(batch, results):
+            if accepted:
+                self.sent += 1
+                continue
+            message.attempts += 1
+            if message.attempts >= self.max_attempts:
+                self.failed += 1
+                logger.error(f"Giving up on SMS to {message.phone} after {message.attempts} attempts")
+            else:
+                retries.append(message)
+
+        if retries:
+            # Exponential backoff with jitter, then back into the queue
+            attempts = max(message.attempts for message in retries)
+            await asyncio.sleep(self.base_backoff * (2 ** (attempts - 1)) * (1 + random.random()))
+            for message in retries:
+                try:
+                    self._queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    self.dropped += 1
+                    logger.error(f"SMS queue full, dropping retry to {message.phone}")
+
+    def stats(self):
+        return {
+            "gateway": self.gateway.name,
+            "queued": self._queue.qsize(),
+            "in_flight_batches": len(self._in_flight),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+In-process benchmark of the auth hot path.
+
+Drives the FastAPI app through an ASGI transport (no network), against a
+local mongod (--mongo-url) or an in-memory Mongo stand-in (mongomock-motor),
+with StreamChat stubbed out. Each virtual user runs
+send-code -> verify-code -> check-session -> profile, and the results are
+written as JSON so runs can be compared across commits.
+
+After the concurrent run, a few more users run one at a time to measure
+the CPU time each route costs in the server process (concurrent requests
+would bill each other's work). A final scenario seeds one user with
+--contacts contacts and loads their whole contact list, in pages of 1000,
+--contact-reads times. --baseline prints the per-route change against an
+earlier report.
+
+    python backend_benchmark.py --users 500 --concurrency 20
+    python backend_benchmark.py --mongo-url mongodb://localhost:27017 --output bench.json
+    python backend_benchmark.py --baseline benchmark_results_main.json
+    python backend_benchmark.py --contacts 5000 --contact-reads 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+
+# Largest page GET /api/users/contacts accepts (pagination.MAX_PAGE_SIZE)
+CONTACTS_PAGE_SIZE = 1000
+
+
+class StubStreamChannel:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def create(self, user_id):
+        return {}
+
+
+class StubStreamChat:
+    """Stand-in for stream_chat.StreamChat, no network calls"""
+    def __init__(self, api_key=None, api_secret=None, **kwargs):
+        pass
+
+    def update_user(self, user):
+        return {}
+
+    def create_token(self, user_id):
+        return f"stub-token-{user_id}"
+
+    def channel(self, *args, **kwargs):
+        return StubStreamChannel()
+
+
+def load_app(mongo_url, db_name):
+    """Import the backend with the benchmark environment and stubs in place"""
+    os.environ["MONGO_URL"] = mongo_url or "mongodb://localhost:27017"
+    os.environ["DB_NAME"] = db_name
+    os.environ.setdefault("STREAM_API_KEY", "benchmark")
+    os.environ.setdefault("STREAM_API_SECRET", "benchmark")
+    os.environ.setdefault("STREAM_APP_ID", "benchmark")
+    # Every virtual user comes from the same client address
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    import stream_chat
+    stream_chat.StreamChat = StubStreamChat
+
+    if not mongo_url:
+        try:
+            import mongomock_motor
+        except ImportError:
+            sys.exit("In-memory mode needs mongomock-motor (pip install mongomock-motor), or pass --mongo-url")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+        # GridFS needs a real database, keep avatars in a scratch directory instead
+        os.environ["AVATAR_STORE"] = "filesystem"
+        os.environ["AVATAR_STORE_PATH"] = tempfile.mkdtemp(prefix="benchmark_avatars_")
+        # No change streams without a replica set
+        os.environ["CHANGE_STREAMS_ENABLED"] = "false"
+
+    sys.path.insert(0, BACKEND_DIR)
+    import server
+    return server
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.cpu_samples = {}
+        self.errors = {}
+
+    async def call(self, client, route, method, url, **kwargs):
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        response = await client.request(method, url, **kwargs)
+        cpu_ms = (time.process_time() - cpu_started) * 1000
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.samples.setdefault(route, []).append(elapsed_ms)
+        self.cpu_samples.setdefault(route, []).append(cpu_ms)
+        if response.status_code >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def summary(self, wall_seconds, cpu_recorder=None):
+        routes = {}
+        for route, samples in self.samples.items():
+            ordered = sorted(samples)
+            routes[route] = {
+                "requests": len(ordered),
+                "errors": self.errors.get(route, 0),
+                "throughput_rps": round(len(ordered) / wall_seconds, 2),
+                "mean_ms": round(sum(ordered) / len(ordered), 3),
+                "p50_ms": round(percentile(ordered, 50), 3),
+                "p95_ms": round(percentile(ordered, 95), 3),
+                "p99_ms": round(percentile(ordered, 99), 3),
+            }
+            cpu_samples = (cpu_recorder.cpu_samples if cpu_recorder else {}).get(route)
+            if cpu_samples:
+                # Client-side work is included, but it is the same for every commit
+                routes[route]["cpu_ms"] = round(sum(cpu_samples) / len(cpu_samples), 3)
+        return routes
+
+
+async def virtual_user(client, recorder, index):
+    """One user logging in and loading their profile"""
+    phone = f"7{index:08d}"
+    country_code = "+225"
+
+    await recorder.call(client, "POST /api/auth/send-code", "POST", "/api/auth/send-code",
+                        json={"phone": phone, "country_code": country_code})
+    response = await recorder.call(client, "POST /api/auth/verify-code", "POST", "/api/auth/verify-code",
+                                   json={"phone": phone, "country_code": country_code, "code": "123456"})
+    session_id = response.json().get("session_id")
+    if not session_id:
+        return
+
+    await recorder.call(client, "GET /api/auth/check-session/{session_id}", "GET",
+                        f"/api/auth/check-session/{session_id}")
+    await recorder.call(client, "POST /api/profile/create", "POST", f"/api/profile/create?session_id={session_id}",
+                        json={"first_name": "Bench", "last_name": f"User{index}"})
+    await recorder.call(client, "GET /api/profile/{session_id}", "GET", f"/api/profile/{session_id}")
+
+
+async def seed_contacts(server, profile_id, count):
+    """Give a profile `count` contacts, written straight to the database"""
+    now = datetime.utcnow()
+    profiles = [
+        {
+            "id": str(uuid.uuid4()), "phone": f"6{index:08d}", "country_code": "+225",
+            "first_name": "Contact", "last_name": f"N{index}", "city": "Abidjan", "country": "CI",
+            "phone_key": f"2256{index:08d}",
+            "created_at": now, "updated_at": now, "version": 1,
+        }
+        for index in range(count)
+    ]
+    await server.db.user_profiles.insert_many(profiles)
+    await server.db.user_contacts.insert_many([
+        {"id": str(uuid.uuid4()), "user_id": profile_id, "contact_id": profile["id"], "added_at": now}
+        for profile in profiles
+    ])
+
+
+async def contacts_scenario(client, server, recorder, args):
+    """One user with many contacts loading their contact list, uncached"""
+    phone, country_code = "799999999", "+225"
+    await client.post("/api/auth/send-code", json={"phone": phone, "country_code": country_code})
+    response = await client.post("/api/auth/verify-code",
+                                 json={"phone": phone, "country_code": country_code, "code": "123456"})
+    session_id = response.json()["session_id"]
+    response = await client.post(f"/api/profile/create?session_id={session_id}",
+                                 json={"first_name": "Bench", "last_name": "Contacts"})
+    await seed_contacts(server, response.json()["profile"]["id"], args.contacts)
+
+    started = time.perf_counter()
+    for _ in range(args.contact_reads):
+        # Load the whole list in the largest pages, as a client showing every contact would
+        params = {"limit": CONTACTS_PAGE_SIZE}
+        while True:
+            response = await recorder.call(client, "GET /api/users/contacts/{session_id}", "GET",
+                                           f"/api/users/contacts/{session_id}", params=params)
+            next_cursor = response.json().get("next_cursor")
+            if not next_cursor:
+                break
+            params = {"limit": CONTACTS_PAGE_SIZE, "cursor": next_cursor}
+    return time.perf_counter() - started
+
+
+async def run_benchmark(args):
+    import httpx
+
+    db_name = f"benchmark_{uuid.uuid4().hex[:8]}"
+    server = load_app(args.mongo_url, db_name)
+    logging.getLogger().setLevel(args.log_level)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    await server.app.router.startup()
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(client, index):
+        async with semaphore:
+            await virtual_user(client, recorder, index)
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            started = time.perf_counter()
+            await asyncio.gather(*[limited(client, index) for index in range(args.users)])
+            wall_seconds = time.perf_counter() - started
+
+            cpu_recorder = Recorder()
+            for index in range(args.users, args.users + args.cpu_users):
+                await virtual_user(client, cpu_recorder, index)
+
+            contacts_recorder = Recorder()
+            if args.contacts and args.contact_reads:
+                contacts_seconds = await contacts_scenario(client, server, contacts_recorder, args)
+    finally:
+        if args.mongo_url:
+            await server.client.drop_database(db_name)
+        await server.app.router.shutdown()
+
+    total_requests = sum(len(samples) for samples in recorder.samples.values())
+    routes = recorder.summary(wall_seconds, cpu_recorder)
+    if contacts_recorder.samples:
+        # Sequential reads, so their CPU time is not shared with other requests
+        routes.update(contacts_recorder.summary(contacts_seconds, contacts_recorder))
+    return {
+        "label": args.label,
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "cpu_users": args.cpu_users,
+            "contacts": args.contacts,
+            "mongo": "mongod" if args.mongo_url else "in-memory",
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(total_requests / wall_seconds, 2),
+        "routes": routes,
+    }
+
+
+def git_label():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def print_report(report):
+    print(f"\n=== Benchmark {report['label']} ({report['config']}) ===")
+    print(f"Overall: {report['throughput_rps']} req/s over {report['wall_seconds']} s")
+    print(f"{'route':45} {'req':>6} {'err':>4} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'cpu':>8}")
+    for route, stats in report["routes"].items():
+        print(
+            f"{route:45} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput_rps']:>9} "
+            f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats.get('cpu_ms', '-'):>8}"
+        )
+
+
+def print_comparison(report, baseline):
+    """Per-route change against an earlier report (negative is better)"""
+    print(f"\n=== {report['label']} vs {baseline['label']} ===")
+    print(f"{'route':45} {'cpu ms':>16} {'p50 ms':>16}")
+    for route, stats in report["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before:
+            print(f"{route:45} {'(new route)':>16}")
+            continue
+        columns = []
+        for metric in ("cpu_ms", "p50_ms"):
+            if metric in stats and metric in before and before[metric]:
+                change = (stats[metric] - before[metric]) / before[metric] * 100
+                columns.append(f"{stats[metric] - before[metric]:+.3f} ({change:+.0f}%)")
+            else:
+                columns.append("-")
+        print(f"{route:45} {columns[0]:>16} {columns[1]:>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="number of virtual users (default 200)")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent virtual users (default 10)")
+    parser.add_argument("--cpu-users", type=int, default=50, help="users run one at a time for CPU cost (default 50)")
+    parser.add_argument("--contacts", type=int, default=1000, help="contacts of the contact-list user (default 1000)")
+    parser.add_argument("--contact-reads", type=int, default=20, help="contact list loads (default 20)")
+    parser.add_argument("--baseline", default=None, help="earlier JSON report to compare against")
+    parser.add_argument("--mongo-url", default=None, help="local mongod URL; in-memory Mongo if omitted")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON report path")
+    parser.add_argument("--label", default=None, help="run label, defaults to the git commit")
+    parser.add_argument("--log-level", default="WARNING", help="server log level during the run (default WARNING)")
+    args = parser.parse_args()
+    args.label = args.label or git_label()
+
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(report, json.load(f))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
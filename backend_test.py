@@ -13,6 +13,7 @@ from dotenv import load_dotenv
 load_dotenv("/app/frontend/.env")
 
 # Use the REACT_APP_BACKEND_URL from frontend/.env
+# The suite sends many codes from one address: run the backend with RATE_LIMIT_ENABLED=false
 BACKEND_URL = os.environ.get("REACT_APP_BACKEND_URL", "http://localhost:8001")
 
 print(f"Using backend URL: {BACKEND_URL}")
@@ -177,6 +178,7 @@ def create_and_verify_session(phone, country_code):
         f"{BACKEND_URL}/api/auth/send-code", 
         json={"phone": phone, "country_code": country_code}
     )
+    assert response.status_code != 429, "Rate limited: run the backend with RATE_LIMIT_ENABLED=false"
     session_id = response.json()["session_id"]
     
     # Verify session
@@ -374,6 +376,61 @@ def test_profile_update_endpoint(session_id):
     
     return True
 
+def test_profile_patch_endpoint(session_id):
+    """Test the /api/profile/{session_id} PATCH endpoint"""
+    print("\n=== Testing PATCH /api/profile/{session_id} ===")
+    
+    url = f"{BACKEND_URL}/api/profile/{session_id}"
+    headers = {"Content-Type": "application/merge-patch+json"}
+    
+    response = requests.get(url)
+    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
+    version = response.json()["profile"]["version"]
+    etag = response.headers["ETag"]
+    
+    # A valid patch returns only the changes and bumps the version
+    print("\nTesting with a valid patch:")
+    response = requests.patch(url, json={"city": "Lyon"}, headers=headers)
+    print(f"Response status code: {response.status_code}")
+    print(f"Response body: {response.text}")
+    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
+    data = response.json()
+    assert data["changes"]["city"] == "Lyon", "Expected the patched city in changes"
+    assert data["version"] == version + 1, f"Expected version {version + 1}, got {data['version']}"
+    assert response.headers["ETag"] != etag, "Expected a new ETag after the patch"
+    new_etag = response.headers["ETag"]
+    
+    # Invalid patches are rejected without writing anything
+    invalid_patches = [
+        ({}, "empty patch"),
+        ({"unknown_field": "x"}, "unknown field"),
+        ({"first_name": None}, "null on a required field"),
+        ({"avatar_base64": "aGVsbG8="}, "avatar_base64"),
+    ]
+    for patch, label in invalid_patches:
+        print(f"\nTesting with {label}:")
+        response = requests.patch(url, json=patch, headers=headers)
+        print(f"Response status code: {response.status_code}")
+        print(f"Response body: {response.text}")
+        assert response.status_code == 400, f"Expected status code 400 for {label}, got {response.status_code}"
+    
+    response = requests.get(url)
+    assert response.json()["profile"]["version"] == version + 1, "Rejected patches must not bump the version"
+    
+    # If-Match with a stale ETag is refused, the current one applies
+    print("\nTesting If-Match with a stale ETag:")
+    response = requests.patch(url, json={"city": "Paris"}, headers={**headers, "If-Match": etag})
+    print(f"Response status code: {response.status_code}")
+    assert response.status_code == 412, f"Expected status code 412, got {response.status_code}"
+    
+    print("\nTesting If-Match with the current ETag:")
+    response = requests.patch(url, json={"city": "Paris"}, headers={**headers, "If-Match": new_etag})
+    print(f"Response status code: {response.status_code}")
+    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
+    assert response.json()["version"] == version + 2, "Expected the version to be bumped again"
+    
+    return True
+
 def test_network_endpoint(session_id):
     """Test the /api/network/{session_id} endpoint"""
     print("\n=== Testing GET /api/network/{session_id} ===")
@@ -1105,15 +1162,17 @@ def test_mongodb_connectivity():
     """Test MongoDB connectivity by checking if sessions are stored properly"""
     print("\n=== Testing MongoDB Connectivity ===")
     
-    # First, create a new session
+    # First, create a new session with a phone no other test sends codes to
+    phone = f"650556{int(time.time()) % 10000:04d}"
     url = f"{BACKEND_URL}/api/auth/send-code"
     payload = {
-        "phone": "6505559999",
+        "phone": phone,
         "country_code": "+1"
     }
     
     print(f"Creating a new session via {url}")
     response = requests.post(url, json=payload)
+    assert response.status_code != 429, "Rate limited: run the backend with RATE_LIMIT_ENABLED=false"
     assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
     
     data = response.json()
@@ -1137,7 +1196,7 @@ def test_mongodb_connectivity():
     # Now verify the session
     url = f"{BACKEND_URL}/api/auth/verify-code"
     payload = {
-        "phone": "6505559999",
+        "phone": phone,
         "country_code": "+1",
         "code": "123456"
     }
@@ -1695,6 +1754,10 @@ def run_comprehensive_tests():
             }
             requests.post(f"{BACKEND_URL}/api/profile/create?session_id={session_id}", json=profile_data)
         
+        # Test profile patches
+        print("\n=== Testing Profile Patches ===")
+        test_profile_patch_endpoint(session_id)
+        
         # Test GetStream functionality
         print("\n=== Testing GetStream Functionality ===")
         test_chat_token_endpoint(session_id)
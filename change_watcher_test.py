@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from change_watcher import ChangeWatcher
+
+# Change streams need a replica set; a local single-node one is enough:
+#   mongod --replSet rs0 --dbpath /tmp/rs0, then rs.initiate() in mongosh
+MONGO_REPLSET_URL = os.environ.get("MONGO_REPLSET_URL", "mongodb://localhost:27017/?directConnection=true")
+
+# High-water-mark resume token at 1970-01-01T00:00:01, long before the oplog starts
+EXPIRED_RESUME_TOKEN = {"_data": "8200000001000000012B0229296E04"}
+
+print(f"Using replica set URL: {MONGO_REPLSET_URL}")
+
+async def wait_for(condition, timeout=10.0):
+    """Helper function to poll until condition() is true"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Timed out waiting for the change stream")
+        await asyncio.sleep(0.05)
+
+async def start(watcher):
+    """Helper function to run a watcher until its stream is open"""
+    task = asyncio.create_task(watcher.run())
+    await wait_for(lambda: watcher.active or task.done())
+    assert watcher.active, f"Watcher did not start: {watcher.stats()}"
+    return task
+
+async def stop(task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+def recording_watcher(db, received, name="test-watcher"):
+    """Watcher subscribed to all profile writes and to session deletes only"""
+    watcher = ChangeWatcher(db, name=name, checkpoint_interval=0)
+    watcher.subscribe(
+        "profiles",
+        lambda change: received.append(("profiles", change["operationType"], change.get("fullDocument"))),
+        fields=("name",)
+    )
+    watcher.subscribe(
+        "sessions",
+        lambda change: received.append(("sessions", change["operationType"], change["documentKey"]["_id"])),
+        operations=["delete"]
+    )
+    return watcher
+
+async def exercise_filtering(db):
+    """Only subscribed collections and operations reach the callbacks, with projected documents"""
+    received = []
+    watcher = recording_watcher(db, received)
+    task = await start(watcher)
+    try:
+        await db.sessions.insert_one({"_id": "s1"})
+        await db.unwatched.insert_one({"id": "u1"})
+        await db.profiles.insert_one({"id": "p1", "name": "Awa", "secret": "x"})
+        await db.profiles.update_one({"id": "p1"}, {"$set": {"name": "Awa K."}})
+        await db.sessions.delete_one({"_id": "s1"})
+        await db.profiles.insert_one({"id": "sentinel", "name": "end"})
+        await wait_for(lambda: any(doc == {"id": "sentinel", "name": "end"} for _, _, doc in received))
+    finally:
+        await stop(task)
+
+    expected = [
+        ("profiles", "insert", {"id": "p1", "name": "Awa"}),
+        ("profiles", "update", {"id": "p1", "name": "Awa K."}),
+        ("sessions", "delete", "s1"),
+        ("profiles", "insert", {"id": "sentinel", "name": "end"}),
+    ]
+    assert received == expected, f"Expected {expected}, got {received}"
+    assert watcher.events == len(expected), f"Expected {len(expected)} events, got {watcher.events}"
+    print("✅ Unsubscribed collections and operations are filtered out, documents are projected")
+
+    # The first start had no token, so subscribers were told to reset
+    assert watcher.resets == 1, f"Expected one reset, got {watcher.resets}"
+    print("✅ A fresh start resets subscribers once")
+
+async def exercise_resume(db):
+    """A restarted watcher resumes from its checkpoint and sees writes made while it was down"""
+    received = []
+    first = recording_watcher(db, received, name="resume-watcher")
+    task = await start(first)
+    try:
+        await db.profiles.insert_one({"id": "before", "name": "A"})
+        await wait_for(lambda: len(received) == 1)
+    finally:
+        await stop(task)
+
+    state = await db.change_stream_state.find_one({"_id": "resume-watcher"})
+    assert state and state.get("resume_token"), "Expected a checkpointed resume token"
+    print("✅ The resume token was checkpointed")
+
+    await db.profiles.insert_one({"id": "while-down", "name": "B"})
+
+    second = recording_watcher(db, received, name="resume-watcher")
+    task = await start(second)
+    try:
+        await wait_for(lambda: len(received) == 2)
+    finally:
+        await stop(task)
+
+    assert received[1] == ("profiles", "insert", {"id": "while-down", "name": "B"}), f"Got {received}"
+    assert second.resets == 0, f"Resuming must not reset subscribers, got {second.resets}"
+    print("✅ The restarted watcher resumed and caught the write it missed, without a reset")
+
+async def exercise_unresumable(db):
+    """A token the server cannot resume from resets subscribers and starts fresh"""
+    await db.change_stream_state.insert_one({"_id": "expired-watcher", "resume_token": EXPIRED_RESUME_TOKEN})
+
+    received = []
+    watcher = recording_watcher(db, received, name="expired-watcher")
+    task = await start(watcher)
+    try:
+        assert watcher.resets == 1, f"Expected one reset, got {watcher.resets}"
+        await db.profiles.insert_one({"id": "after", "name": "C"})
+        await wait_for(lambda: len(received) == 1)
+    finally:
+        await stop(task)
+
+    assert received == [("profiles", "insert", {"id": "after", "name": "C"})], f"Got {received}"
+    print("✅ An unresumable token reset subscribers and the watcher carried on from now")
+
+def test_change_watcher():
+    """Test ChangeWatcher against a replica set"""
+    print("\n=== Testing ChangeWatcher ===")
+
+    async def run():
+        client = AsyncIOMotorClient(MONGO_REPLSET_URL, serverSelectionTimeoutMS=2000)
+        try:
+            hello = await client.admin.command("hello")
+        except Exception as e:
+            print(f"⚠️ Mongo not reachable, skipping: {e}")
+            client.close()
+            return
+        if "setName" not in hello:
+            print("⚠️ Mongo is not a replica set, skipping")
+            client.close()
+            return
+
+        db = client[f"change_watcher_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await exercise_filtering(db)
+            await exercise_resume(db)
+            await exercise_unresumable(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_change_watcher()
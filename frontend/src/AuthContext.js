@@ -64,6 +64,11 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    if (sessionId) {
+      fetch(`${backendUrl}/api/auth/logout/${sessionId}`, { method: 'POST' }).catch((error) => {
+        console.error('Error logging out:', error);
+      });
+    }
     setIsAuthenticated(false);
     setSessionId(null);
     setUserPhone(null);
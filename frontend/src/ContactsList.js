@@ -18,14 +18,23 @@ const ContactsList = ({ isOpen, onClose }) => {
   const fetchContacts = async () => {
     setIsLoading(true);
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/users/contacts/${sessionId}`);
-      const data = await response.json();
+      // Contacts come in pages; follow next_cursor until the last one
+      let allContacts = [];
+      let cursor = null;
+      do {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/users/contacts/${sessionId}${query}`);
+        const data = await response.json();
 
-      if (data.success) {
-        setContacts(data.contacts);
-      } else {
-        console.error('Error fetching contacts:', data.message);
-      }
+        if (!data.success) {
+          console.error('Error fetching contacts:', data.message);
+          return;
+        }
+        allContacts = allContacts.concat(data.contacts);
+        cursor = data.next_cursor;
+      } while (cursor);
+
+      setContacts(allContacts);
     } catch (error) {
       console.error('Error fetching contacts:', error);
     } finally {
@@ -95,7 +104,7 @@ const ContactsList = ({ isOpen, onClose }) => {
                 <div className="flex items-center space-x-3">
                   <div className="w-10 h-10 bg-blue-500 rounded-full flex items-center justify-center">
                     <img
-                      src={contact.avatar_url}
+                      src={`${process.env.REACT_APP_BACKEND_URL}${contact.avatar_url}`}
                       alt="Avatar"
                       className="w-10 h-10 rounded-full"
                     />
@@ -317,11 +317,12 @@ export const ProfileEditModal = ({ isOpen, onClose, sessionId, currentProfile, o
         city: currentProfile.city || '',
         country: currentProfile.country || '',
         occupation: currentProfile.occupation || '',
-        avatar_base64: currentProfile.avatar_base64 || '',
+        // Only sent when the photo is changed or removed
+        avatar_base64: undefined,
         language: currentProfile.language || 'fr',
         currency: currentProfile.currency || 'FCFA'
       });
-      setAvatarPreview(currentProfile.avatar_base64 || '');
+      setAvatarPreview(currentProfile.avatar_url ? `${backendUrl}${currentProfile.avatar_url}?size=256` : '');
     }
   }, [currentProfile]);
 
@@ -373,11 +374,17 @@ export const ProfileEditModal = ({ isOpen, onClose, sessionId, currentProfile, o
     setError('');
 
     try {
+      const headers = {
+        'Content-Type': 'application/json',
+      };
+      // Rejected with 412 if the profile was changed from another device meanwhile
+      if (currentProfile?.version) {
+        headers['If-Match'] = String(currentProfile.version);
+      }
+
       const response = await fetch(`${backendUrl}/api/profile/${sessionId}`, {
         method: 'PUT',
-        headers: {
-          'Content-Type': 'application/json',
-        },
+        headers,
         body: JSON.stringify(formData)
       });
 
@@ -387,7 +394,7 @@ export const ProfileEditModal = ({ isOpen, onClose, sessionId, currentProfile, o
         onProfileUpdated(data.profile);
         onClose();
       } else {
-        setError(data.message);
+        setError(data.message || data.detail);
       }
     } catch (error) {
       console.error('Error updating profile:', error);
@@ -91,6 +91,11 @@ export const ProfileProvider = ({ children }) => {
     }
   };
 
+  // Merge changes saved elsewhere (e.g. a PATCH) so the cached version stays current
+  const applyProfileChanges = (changes) => {
+    setProfile((current) => (current ? { ...current, ...changes } : current));
+  };
+
   // Clear profile (on logout)
   const clearProfile = () => {
     setProfile(null);
@@ -105,6 +110,7 @@ export const ProfileProvider = ({ children }) => {
     loadProfile,
     createProfile,
     updateProfile,
+    applyProfileChanges,
     clearProfile
   };
 
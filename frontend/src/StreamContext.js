@@ -203,14 +203,21 @@ export const StreamProvider = ({ children }) => {
     }
 
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/chat/channels/${sessionId}`);
-      
-      if (!response.ok) {
-        throw new Error('Failed to get user channels');
-      }
+      let channels = [];
+      let cursor = null;
+      do {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/chat/channels/${sessionId}${query}`);
+        
+        if (!response.ok) {
+          throw new Error('Failed to get user channels');
+        }
 
-      const data = await response.json();
-      return data.channels;
+        const data = await response.json();
+        channels = channels.concat(data.channels);
+        cursor = data.next_cursor;
+      } while (cursor);
+      return channels;
     } catch (error) {
       console.error('Error getting user channels:', error);
       throw error;
@@ -3,6 +3,7 @@ import { useProfile } from './ProfileContext';
 
 const TrustPassportPage = ({ sessionId, onClose, onEditProfile }) => {
   const { profile } = useProfile();
+  const backendUrl = process.env.REACT_APP_BACKEND_URL || import.meta.env.REACT_APP_BACKEND_URL;
 
   if (!profile) {
     return null;
@@ -120,8 +121,8 @@ const TrustPassportPage = ({ sessionId, onClose, onEditProfile }) => {
             {/* Profile Header */}
             <div className="flex items-center space-x-6">
               <div className="w-20 h-20 rounded-full overflow-hidden bg-white/20 border-4 border-white/30">
-                {profile.avatar_base64 ? (
-                  <img src={profile.avatar_base64} alt="Profile" className="w-full h-full object-cover" />
+                {profile.avatar_url ? (
+                  <img src={`${backendUrl}${profile.avatar_url}?size=128`} alt="Profile" className="w-full h-full object-cover" />
                 ) : (
                   <div className="w-full h-full flex items-center justify-center text-white">
                     <svg className="w-12 h-12" fill="none" stroke="currentColor" viewBox="0 0 24 24">
@@ -1,5 +1,6 @@
 import React, { createContext, useContext, useState, useEffect, useMemo } from 'react';
 import { useTranslation } from 'react-i18next';
+import { useProfile } from './ProfileContext';
 
 const TutorialContext = createContext();
 
@@ -13,6 +14,7 @@ export const useTutorial = () => {
 
 export const TutorialProvider = ({ children }) => {
   const { t } = useTranslation();
+  const { applyProfileChanges } = useProfile();
   const [isActive, setIsActive] = useState(false);
   const [currentStep, setCurrentStep] = useState(0);
   const [hasCompletedTutorial, setHasCompletedTutorial] = useState(false);
@@ -101,15 +103,22 @@ export const TutorialProvider = ({ children }) => {
 
       const backendUrl = process.env.REACT_APP_BACKEND_URL || import.meta.env.REACT_APP_BACKEND_URL;
       
-      await fetch(`${backendUrl}/api/profile/${sessionId}`, {
-        method: 'PUT',
+      const response = await fetch(`${backendUrl}/api/profile/${sessionId}`, {
+        method: 'PATCH',
         headers: {
-          'Content-Type': 'application/json',
+          'Content-Type': 'application/merge-patch+json',
         },
         body: JSON.stringify({
           has_completed_tutorial: true
         })
       });
+
+      // The PATCH bumped the profile version; keep it in sync or the next
+      // profile edit would send a stale If-Match and get a 412
+      const data = await response.json();
+      if (data.success) {
+        applyProfileChanges({ ...data.changes, version: data.version });
+      }
     } catch (error) {
       console.error('Error updating tutorial completion:', error);
     }
@@ -186,7 +186,7 @@ const UserSearchModal = ({ isOpen, onClose }) => {
                   <div className="flex items-center space-x-3">
                     <div className="w-12 h-12 bg-blue-500 rounded-full flex items-center justify-center">
                       <img
-                        src={searchResults.user_data.avatar_url}
+                        src={`${process.env.REACT_APP_BACKEND_URL}${searchResults.user_data.avatar_url}`}
                         alt="Avatar"
                         className="w-12 h-12 rounded-full"
                       />
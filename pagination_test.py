@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pagination import encode_cursor, decode_cursor, keyset_page, InvalidCursor
+
+# A local mongod is enough for the keyset queries
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+print(f"Using Mongo URL: {MONGO_URL}")
+
+def test_cursor_round_trip():
+    """Test that cursors decode to what was encoded"""
+    print("\n=== Testing cursor encoding ===")
+    added_at = datetime(2024, 5, 17, 9, 30, 15, 123000)
+    assert decode_cursor(encode_cursor(added_at, "abc")) == (added_at, "abc")
+    assert decode_cursor(encode_cursor(42, "abc")) == (42, "abc")
+    print("✅ Datetime and plain cursors round-trip")
+
+    for cursor in ["", "not a cursor", encode_cursor(1, "x")[:-3], "W10"]:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor:
+            continue
+        raise AssertionError(f"Expected {cursor!r} to be rejected")
+    print("✅ Malformed cursors are rejected")
+
+def test_keyset_page():
+    """Test paging through documents that share sort values"""
+    print("\n=== Testing keyset_page ===")
+
+    async def run():
+        client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=2000)
+        db = client[f"pagination_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await client.admin.command("ping")
+        except Exception as e:
+            print(f"⚠️ Mongo not reachable, skipping: {e}")
+            return
+        try:
+            # Three documents per timestamp, so pages must break ties on id
+            timestamps = [datetime(2024, 1, 1, 12, minute) for minute in range(4)]
+            documents = [
+                {"id": f"{index:03d}", "owner": "a", "added_at": timestamps[index % 4]}
+                for index in range(12)
+            ]
+            await db.items.insert_many(documents + [{"id": "999", "owner": "b", "added_at": timestamps[0]}])
+            expected = [d["id"] for d in sorted(documents, key=lambda d: (d["added_at"], d["id"]))]
+
+            seen, cursor, pages = [], None, 0
+            while True:
+                page, cursor = await keyset_page(db.items, {"owner": "a"}, "added_at", 5, cursor, {"_id": 0})
+                seen += [d["id"] for d in page]
+                pages += 1
+                if not cursor:
+                    break
+            assert seen == expected, f"Expected {expected}, got {seen}"
+            assert pages == 3, f"Expected 3 pages, got {pages}"
+            print(f"✅ {len(seen)} documents over {pages} pages, in order, without duplicates")
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_cursor_round_trip()
+    test_keyset_page()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from phone_hash_index import PhoneHashIndex
+from phone_keys import canonical_phone_key, phonebook_keys, e164_number, e164_hash
+
+def test_canonical_phone_key():
+    """Test that the trunk zero does not change a stored number's key"""
+    print("\n=== Testing canonical_phone_key ===")
+    assert canonical_phone_key("0612345678", "+33") == "33612345678"
+    assert canonical_phone_key("612345678", "+33") == "33612345678"
+    # Matching keys drop every leading zero, even where E.164 keeps it
+    assert canonical_phone_key("0712345678", "+225") == "225712345678"
+    print("✅ Stored numbers with and without trunk zero share a key")
+
+def test_e164_number():
+    """Test the E.164 form hashed discovery is computed from"""
+    print("\n=== Testing e164_number ===")
+    assert e164_number("0612345678", "+33") == "+33612345678"
+    assert e164_number("612345678", "+33") == "+33612345678"
+    print("✅ The trunk zero is dropped in France")
+
+    # Côte d'Ivoire's 10-digit numbers keep their leading 0
+    assert e164_number("0712345678", "+225") == "+2250712345678"
+    assert e164_number("07 12 34 56 78", "225") == "+2250712345678"
+    assert e164_number("0612345678", "+39") == "+390612345678"
+    print("✅ The leading zero is kept where it is part of the number")
+
+    assert e164_hash("+2250712345678") == "19f4ab1beb21a921faf19b18821013c7a01bed8552d579c9218658f3799396c6"
+    print("✅ Hashes are the SHA-256 hex digest of the E.164 string")
+
+def test_phonebook_keys():
+    """Test phonebook entries in the formats people save numbers in"""
+    print("\n=== Testing phonebook_keys ===")
+    stored = canonical_phone_key("0612345678", "+33")
+    for entry in ["06 12 34 56 78", "06-12-34-56-78", "(06) 12.34.56.78", "+33 6 12 34 56 78",
+                  "+33 (0)6 12 34 56 78", "0033612345678", " +33612345678 "]:
+        keys = phonebook_keys(entry, "+33")
+        assert stored in keys, f"Expected {stored} among keys of {entry!r}, got {keys}"
+        assert len(keys) <= 3, f"Expected at most 3 keys for {entry!r}, got {keys}"
+        print(f"✅ {entry!r} -> {keys}")
+
+    # National numbers take the default country code
+    assert phonebook_keys("07 12 34 56 78", "+225") == ["225712345678"]
+    assert phonebook_keys("07 12 34 56 78", "+33") == ["33712345678"]
+    print("✅ National numbers use the default country code")
+
+    for entry in ["", "   ", "abc", "+", "00", "0000"]:
+        assert phonebook_keys(entry, "+33") == [], f"Expected no keys for {entry!r}"
+    print("✅ Entries without a number give no keys")
+
+def test_phone_hash_index():
+    """Test prefix candidates and confirmed hash lookups"""
+    print("\n=== Testing PhoneHashIndex ===")
+    index = PhoneHashIndex(prefix_length=4)
+    index.put({"id": "profile-1", "phone": "0612345678", "country_code": "+33"})
+    index.put({"id": "profile-2", "phone": "0712345678", "country_code": "+225"})
+    index.put({"id": "profile-1", "phone": "612345678", "country_code": "+33"})
+    assert index.size == 2, f"Expected 2 numbers, got {index.size}"
+
+    # Clients hash real E.164 numbers, e.g. as formatted by libphonenumber
+    registered = e164_hash("+33612345678")
+    ivorian = e164_hash("+2250712345678")
+    unknown = e164_hash("+33699999999")
+    assert index.profile_ids([ivorian]) == {ivorian: "profile-2"}, "Expected the Ivorian E.164 hash to resolve"
+    candidates = index.candidates([registered[:4], unknown[:4]])
+    assert registered in candidates[registered[:4]], "Expected the registered hash among candidates"
+    assert unknown not in sum(candidates.values(), []), "Unknown hash must not be a candidate"
+    print(f"✅ Candidates for 2 prefixes: {sum(len(v) for v in candidates.values())}")
+
+    assert index.profile_ids([registered, unknown]) == {registered: "profile-1"}
+    print("✅ Only registered full hashes resolve to a profile")
+
+if __name__ == "__main__":
+    test_canonical_phone_key()
+    test_e164_number()
+    test_phonebook_keys()
+    test_phone_hash_index()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from phone_directory import PhoneDirectory
+from profile_index import ProfileIndexLoader
+
+CARD_FIELDS = ("id", "phone", "country_code", "first_name")
+
+class FakeCollection:
+    """Helper collection whose scans call on_profile after yielding each profile"""
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.scans = 0
+        self.on_profile = None
+
+    def find(self, filter, projection):
+        self.scans += 1
+        return self
+
+    def batch_size(self, size):
+        return self._scan()
+
+    async def _scan(self):
+        for profile in list(self.profiles):
+            yield dict(profile)
+            if self.on_profile:
+                await self.on_profile(profile)
+
+def profile(index, first_name="A"):
+    """Helper function to build a stored profile"""
+    return {"id": f"p{index}", "phone": f"07000000{index:02d}", "country_code": "+225", "first_name": first_name}
+
+def test_put_during_load():
+    """Test that profiles put while a rebuild scans are kept"""
+    print("\n=== Testing puts during a load ===")
+
+    async def run():
+        collection = FakeCollection([profile(1), profile(2)])
+        directory = PhoneDirectory(CARD_FIELDS)
+        loader = ProfileIndexLoader(collection, [directory])
+
+        async def write_behind_scan(scanned):
+            # p1 is already scanned when it is renamed
+            if scanned["id"] == "p2":
+                directory.put(profile(1, first_name="B"))
+        collection.on_profile = write_behind_scan
+
+        assert await loader.load() == 2
+        assert directory.get("0700000001", "+225")["first_name"] == "B", "Put during the scan was lost"
+        assert directory.ready
+        print("✅ A put made during the scan survives the swap")
+
+    asyncio.run(run())
+
+def test_reload_during_load():
+    """Test that a load requested while one runs makes it run once more"""
+    print("\n=== Testing reloads requested during a load ===")
+
+    async def run():
+        collection = FakeCollection([profile(1), profile(2)])
+        directory = PhoneDirectory(CARD_FIELDS)
+        loader = ProfileIndexLoader(collection, [directory])
+        requested = []
+
+        async def delete_behind_scan(scanned):
+            # p1 is deleted after the scan passed it, only a new scan can drop it
+            if scanned["id"] == "p2" and not requested:
+                collection.profiles.remove(profile(1))
+                requested.append(await loader.load())
+                requested.append(await loader.load())
+        collection.on_profile = delete_behind_scan
+
+        assert await loader.load() == 1, f"Expected the rerun to count 1 profile, got {loader.profiles}"
+        assert requested == [0, 0], f"Requests during the load must return at once, got {requested}"
+        assert collection.scans == 2, f"Expected exactly one extra scan, got {collection.scans}"
+        assert directory.get("0700000001", "+225") is None, "Deleted profile still in the directory"
+        print("✅ Requests during a load coalesce into one more scan that sees the delete")
+
+        assert await loader.load() == 1 and collection.scans == 3
+        print("✅ The next load scans once")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_put_during_load()
+    test_reload_during_load()
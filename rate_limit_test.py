@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from rate_limit import RateLimiter, TokenBucketLimiter
+
+class FakeClock:
+    """Helper clock advanced by hand"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_refill():
+    """Test that buckets refill at the configured rate up to capacity"""
+    print("\n=== Testing token refill ===")
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate=0.5, capacity=2, clock=clock)
+
+    assert limiter.allow("a") == (True, 0.0)
+    assert limiter.allow("a") == (True, 0.0)
+    allowed, retry_after = limiter.allow("a")
+    assert not allowed and retry_after == 2.0, f"Expected a 2s wait, got {retry_after}"
+    print("✅ An empty bucket rejects and reports the wait")
+
+    clock.now += 2
+    assert limiter.allow("a")[0], "Expected one token after 2s at 0.5/s"
+    assert not limiter.allow("a")[0], "Expected the refilled token to be spent"
+    print("✅ The bucket refills at the configured rate")
+
+    clock.now += 60
+    assert limiter.allow("a")[0] and limiter.allow("a")[0], "Expected a full bucket after a long idle"
+    assert not limiter.allow("a")[0], "Refill must stop at capacity"
+    print("✅ Refill is capped at capacity")
+
+    stats = limiter.stats()
+    assert stats["allowed"] == 5 and stats["rejected"] == 3, f"Unexpected stats {stats}"
+
+def test_shard_eviction():
+    """Test that idle buckets are evicted from their shard"""
+    print("\n=== Testing idle bucket eviction ===")
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate=1, capacity=5, shards=1, idle_seconds=60, clock=clock)
+    limiter.allow("old")
+    clock.now += 30
+    limiter.allow("recent")
+    assert limiter.stats()["buckets"] == 2
+
+    # Only "old" has been idle for 60s when "new" arrives
+    clock.now += 30
+    limiter.allow("new")
+    assert limiter.stats()["buckets"] == 2, f"Expected the idle bucket evicted, got {limiter.stats()}"
+    assert limiter.stats()["evicted"] == 1
+    print("✅ Idle buckets are evicted, recent ones kept")
+
+    # Touching "recent" moves it behind "new", which is then evicted first
+    clock.now += 20
+    limiter.allow("recent")
+    clock.now += 45
+    limiter.allow("other")
+    assert list(limiter._shards[0]) == ["recent", "other"], f"Got {list(limiter._shards[0])}"
+    assert limiter.stats()["evicted"] == 2, f"Got {limiter.stats()}"
+    print("✅ Touching a bucket keeps it from eviction")
+
+def test_scope_rejection():
+    """Test that any scope rejects the request and that rejections charge nothing"""
+    print("\n=== Testing per-scope rejection ===")
+    clock = FakeClock()
+    limiter = RateLimiter({
+        "phone": TokenBucketLimiter(rate=1 / 60, capacity=2, clock=clock),
+        "ip": TokenBucketLimiter(rate=1, capacity=3, clock=clock),
+        "global": TokenBucketLimiter(rate=100, capacity=100, clock=clock)
+    })
+
+    assert limiter.check(phone="p1", ip="1.1.1.1")[0]
+    assert limiter.check(phone="p1", ip="1.1.1.1")[0]
+    allowed, retry_after = limiter.check(phone="p1", ip="1.1.1.1")
+    assert not allowed and retry_after == 60.0, f"Expected the phone scope to reject, got {retry_after}"
+    print("✅ The phone scope rejects its third request")
+
+    # The ip bucket was not charged by the rejected request
+    assert limiter.check(phone="p2", ip="1.1.1.1")[0], "Rejected requests must not charge other scopes"
+    allowed, _ = limiter.check(phone="p3", ip="1.1.1.1")
+    assert not allowed, "Expected the ip scope to reject"
+    print("✅ The ip scope rejects once spent, and rejections charged nothing")
+
+    # p3 was rejected by the ip scope, so its phone bucket is still full
+    assert limiter.check(phone="p3", ip="2.2.2.2")[0] and limiter.check(phone="p3", ip="2.2.2.2")[0]
+    print("✅ A phone rejected for its ip keeps its own tokens")
+
+    # Missing keys skip their scope, the global scope is always charged
+    assert limiter.check(phone=None, ip="3.3.3.3")[0]
+    assert limiter.scopes["global"].stats()["allowed"] == 6, f"Got {limiter.stats()['global']}"
+    print("✅ The global scope is charged on every allowed request")
+
+if __name__ == "__main__":
+    test_refill()
+    test_shard_eviction()
+    test_scope_rejection()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from session_cache import SessionCache
+
+class FakeClock:
+    """Helper clock advanced by hand"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def new_session(phone, country_code="+225"):
+    """Helper function to build a cached session stand-in"""
+    return SimpleNamespace(phone=phone, country_code=country_code)
+
+def test_ttl_expiry():
+    """Test that entries expire after the TTL"""
+    print("\n=== Testing TTL expiry ===")
+    clock = FakeClock()
+    cache = SessionCache(max_entries=10, ttl_seconds=60, clock=clock)
+    session = new_session("0700000001")
+    cache.put("s1", session, {"id": "p1"})
+
+    clock.now += 59
+    assert cache.get("s1") == (session, {"id": "p1"}), "Expected a hit before the TTL"
+    print("✅ Entry is served before the TTL")
+
+    clock.now += 1
+    assert cache.get("s1") is None, "Expected a miss at the TTL"
+    assert len(cache) == 0, "Expired entry must be removed"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1, f"Unexpected stats {cache.stats()}"
+    print("✅ Entry expires at the TTL and is removed")
+
+    # put() again restarts the TTL
+    cache.put("s1", session, None)
+    clock.now += 30
+    cache.put("s1", session, None)
+    clock.now += 45
+    assert cache.get("s1") is not None, "Re-put must restart the TTL"
+    print("✅ Re-putting an entry restarts its TTL")
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted at capacity"""
+    print("\n=== Testing LRU eviction ===")
+    cache = SessionCache(max_entries=3, ttl_seconds=60, clock=FakeClock())
+    for index in range(3):
+        cache.put(f"s{index}", new_session(f"070000000{index}"), None)
+
+    # Touch s0 so s1 becomes the least recently used
+    assert cache.get("s0") is not None
+    cache.put("s3", new_session("0700000003"), None)
+
+    assert len(cache) == 3, f"Expected 3 entries, got {len(cache)}"
+    assert cache.get("s1") is None, "Expected s1 to be evicted"
+    for session_id in ("s0", "s2", "s3"):
+        assert cache.get(session_id) is not None, f"Expected {session_id} to stay cached"
+    assert cache.stats()["evictions"] == 1, f"Expected one eviction, got {cache.stats()}"
+    print("✅ The least recently used entry was evicted")
+
+    # Evicted entries leave no phone index behind
+    assert ("0700000001", "+225") not in cache._by_phone, "Evicted session still indexed by phone"
+    print("✅ Eviction cleans the phone index")
+
+def test_invalidate_phone():
+    """Test dropping every session of a phone number"""
+    print("\n=== Testing invalidate_phone ===")
+    cache = SessionCache(max_entries=10, ttl_seconds=60, clock=FakeClock())
+    cache.put("a1", new_session("0700000001"), None)
+    cache.put("a2", new_session("0700000001"), None)
+    cache.put("b1", new_session("0700000001", "+33"), None)
+    cache.put("c1", new_session("0700000002"), None)
+
+    cache.invalidate_phone("0700000001", "+225")
+    assert cache.get("a1") is None and cache.get("a2") is None, "Expected both sessions of the phone dropped"
+    assert cache.get("b1") is not None, "Same number in another country must stay"
+    assert cache.get("c1") is not None, "Other phones must stay"
+    print("✅ Every session of the phone was dropped, others kept")
+
+    cache.invalidate_phone("0799999999", "+225")
+    assert len(cache) == 2, "Invalidating an unknown phone must be a no-op"
+    print("✅ Unknown phones are a no-op")
+
+if __name__ == "__main__":
+    test_ttl_expiry()
+    test_lru_eviction()
+    test_invalidate_phone()
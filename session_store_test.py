@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from session_store import MemorySessionStore, RedisSessionStore
+
+# A local redis-server is enough for the Redis-protocol backend
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/15")
+
+print(f"Using Redis URL: {REDIS_URL}")
+
+def new_session(phone, country_code="+225", minutes=5):
+    """Helper function to build a pending session dict"""
+    now = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()),
+        "phone": phone,
+        "country_code": country_code,
+        "verification_code": "123456",
+        "is_verified": False,
+        "created_at": now,
+        "expires_at": now + timedelta(minutes=minutes)
+    }
+
+async def exercise_store(store):
+    """Run the full auth flow against a session store"""
+    phone = uuid.uuid4().hex[:9]
+
+    # Concurrent send-code calls converge on one pending session
+    session_ids = await asyncio.gather(*[store.issue_code(new_session(phone)) for _ in range(5)])
+    assert len(set(session_ids)) == 1, f"Expected one pending session, got {set(session_ids)}"
+    assert await store.has_pending(phone, "+225"), "Expected a pending session"
+    print(f"✅ Concurrent issue_code returned a single session {session_ids[0]}")
+
+    # Verify marks the pending session as verified
+    now = datetime.utcnow()
+    verified = await store.verify(phone, "+225", now, now + timedelta(hours=24))
+    assert verified is not None, "Expected verify to succeed"
+    assert verified["id"] == session_ids[0], "Expected the pending session to be verified"
+    assert verified["is_verified"] is True, "Expected is_verified to be True"
+    assert not await store.has_pending(phone, "+225"), "Expected no pending session after verify"
+    print("✅ verify marked the pending session as verified")
+
+    # A second verify has nothing left to verify
+    assert await store.verify(phone, "+225", now, now + timedelta(hours=24)) is None, "Expected second verify to fail"
+    print("✅ Second verify rejected")
+
+    # Sliding renewal pushes expires_at forward
+    seen_at = datetime.utcnow() + timedelta(hours=1)
+    await store.renew_many({session_ids[0]: seen_at}, timedelta(hours=24))
+    renewed = await store.get_verified(session_ids[0])
+    assert renewed["expires_at"] >= seen_at + timedelta(hours=24) - timedelta(seconds=1), "Expected expires_at to be renewed"
+    print("✅ renew_many extended the session")
+
+    # Verified sessions can be read back and deleted
+    session = await store.get_verified(session_ids[0])
+    assert session is not None and session["phone"] == phone, "Expected to read back the verified session"
+    await store.delete(session_ids[0])
+    assert await store.get_verified(session_ids[0]) is None, "Expected session to be deleted"
+    print("✅ get_verified and delete work")
+
+    # Deleting a pending session also clears the phone's pending pointer
+    pending_phone = uuid.uuid4().hex[:9]
+    pending_id = await store.issue_code(new_session(pending_phone))
+    await store.delete(pending_id)
+    assert not await store.has_pending(pending_phone, "+225"), "Expected no pending session after delete"
+    assert await store.issue_code(new_session(pending_phone)) != pending_id, "Expected a fresh session after delete"
+    print("✅ delete cleared the pending session")
+
+    # Expired codes cannot be verified
+    expired_phone = uuid.uuid4().hex[:9]
+    await store.issue_code(new_session(expired_phone, minutes=-1))
+    now = datetime.utcnow()
+    assert await store.verify(expired_phone, "+225", now, now + timedelta(hours=24)) is None, "Expected expired code to fail"
+    print("✅ Expired code rejected")
+
+    # The janitor purge removes the abandoned session
+    await store.purge_expired(datetime.utcnow(), 100)
+    assert not await store.has_pending(expired_phone, "+225"), "Expected abandoned session to be purged"
+    print("✅ purge_expired removed the abandoned session")
+
+def test_memory_session_store():
+    """Test the in-memory session store"""
+    print("\n=== Testing MemorySessionStore ===")
+    asyncio.run(exercise_store(MemorySessionStore()))
+
+def test_redis_session_store():
+    """Test the Redis-protocol session store"""
+    print("\n=== Testing RedisSessionStore ===")
+
+    async def run():
+        store = RedisSessionStore(REDIS_URL)
+        try:
+            await store.redis.ping()
+        except Exception as e:
+            print(f"⚠️ Redis not reachable, skipping: {e}")
+            await store.close()
+            return
+        try:
+            await exercise_store(store)
+        finally:
+            await store.close()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_memory_session_store()
+    test_redis_session_store()